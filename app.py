@@ -1,45 +1,65 @@
 import os
-import json
+import shutil
+import hashlib
 from datetime import datetime
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
-from sqlalchemy import text
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, g, abort, make_response, Response, stream_with_context, after_this_request
+from sqlalchemy import select, text, func
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 from config import Config
-from models import db, User, Job, Lecture, Chat
-from services.orchestrator import OrchestratorService
+from models import db, User, Job, Lecture, Chat, ArtifactCache
+from services.orchestrator import OrchestratorService, signal_cancel
 from services.chat_service import ChatService
 from services.health_check import check_all_services
+from services import job_events
+from services.json_utils import ORJSONProvider, load_json
 import threading
 
 load_dotenv()
 
 app = Flask(__name__)
 app.config.from_object(Config)
+app.json = ORJSONProvider(app)
 
 db.init_app(app)
 
+# Services hold only configuration and pooled HTTP sessions, so one instance per app is shared
+app.extensions['orchestrator'] = OrchestratorService(app)
+app.extensions['chat_service'] = ChatService(app)
+
 def get_orchestrator():
     """Get orchestrator service instance"""
-    return OrchestratorService()
+    return app.extensions['orchestrator']
 
 def get_chat_service():
     """Get chat service instance"""
-    return ChatService()
+    return app.extensions['chat_service']
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+    return filename.lower().endswith(app.config['ALLOWED_SUFFIXES'])
 
 def init_db():
     """Initialize database and create tables"""
     with app.app_context():
         db.create_all()
-        try:
-            db.session.execute(text("ALTER TABLE jobs ADD COLUMN status_message TEXT"))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+        for table, column in (
+            ('jobs', 'status_message TEXT'),
+            ('jobs', 'status_snapshot TEXT'),
+            ('jobs', 'video_hash VARCHAR(128)'),
+            ('artifact_cache', "source VARCHAR(500) NOT NULL DEFAULT ''"),
+        ):
+            try:
+                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column}"))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+        
+        # create_all() skips tables that already exist; add indexes introduced since
+        for table in (Job.__table__, Chat.__table__, ArtifactCache.__table__):
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
         
         # Create default user if none exists
         if User.query.count() == 0:
@@ -64,18 +84,60 @@ def login_required(f):
     return decorated_function
 
 def get_current_user():
-    """Get current logged-in user"""
-    if 'user_id' in session:
-        return User.query.get(session['user_id'])
-    return None
+    """Get current logged-in user (loaded at most once per request)"""
+    if 'user' not in g:
+        g.user = db.session.get(User, session['user_id']) if 'user_id' in session else None
+    return g.user
+
+def get_current_user_id():
+    """Get current logged-in user's id without loading the user row"""
+    return session.get('user_id')
+
+def get_lecture_with_job(lecture_id):
+    """Get a lecture and its job in one query, or 404"""
+    return Lecture.query.options(joinedload(Lecture.job)).filter_by(id=lecture_id).first_or_404()
+
+def get_lecture_owner_id(lecture_id):
+    """Get the id of the user owning a lecture without loading either row, or 404"""
+    owner_id = db.session.query(Job.user_id)\
+        .join(Lecture, Lecture.job_id == Job.id)\
+        .filter(Lecture.id == lecture_id)\
+        .scalar()
+    if owner_id is None:
+        abort(404)
+    return owner_id
+
+def lecture_etag(lecture):
+    """ETag for a lecture page, changing whenever its notes or transcript file is rewritten"""
+    def mtime(path):
+        return os.path.getmtime(path) if path and os.path.exists(path) else 0
+    key = f"{lecture.id}:{mtime(lecture.notes_path)}:{mtime(lecture.transcript_path)}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+def set_lecture_cache_headers(response, etag):
+    """Let the browser keep its copy but revalidate it on every view, so the login check still runs"""
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
 
 # Routes
+def job_list_query(user_id):
+    """Plain rows for the job lists, newest first, without loading Job objects"""
+    return select(
+        Job.id, Job.created_at, Job.ocr_status, Job.whisper_status, Job.llm_status, Job.final_status,
+        # NOT IN is NULL for a NULL status; Job.can_cancel() treats that as cancellable
+        func.coalesce(Job.final_status, '').notin_(Job.FINAL_STATES).label('can_cancel'),
+        Lecture.id.label('lecture_id')
+    ).outerjoin(Lecture, Lecture.job_id == Job.id)\
+        .where(Job.user_id == user_id)\
+        .order_by(Job.created_at.desc())
+
 @app.route('/')
 def index():
     """Home page"""
     user = get_current_user()
     if user:
-        jobs = Job.query.filter_by(user_id=user.id).order_by(Job.created_at.desc()).limit(10).all()
+        jobs = db.session.execute(job_list_query(user.id).limit(10)).mappings().all()
         return render_template('index.html', user=user, recent_jobs=jobs)
     return render_template('index.html', user=None)
 
@@ -88,6 +150,9 @@ def login():
         
         user = User.query.filter_by(email=email).first()
         if user and user.check_password(password):
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
             session['user_id'] = user.id
             flash('Logged in successfully!', 'success')
             return redirect(url_for('index'))
@@ -125,11 +190,145 @@ def logout():
     flash('Logged out successfully.', 'success')
     return redirect(url_for('index'))
 
+def create_upload_job(user_id):
+    """Create job entry and its storage directory; returns (job, video_path)"""
+    job = Job(user_id=user_id, video_path='')
+    db.session.add(job)
+    db.session.commit()
+    
+    storage_path = os.path.join(app.config['UPLOAD_FOLDER'], f'job_{job.id}')
+    os.makedirs(storage_path, exist_ok=True)
+    return job, os.path.join(storage_path, 'video.mp4')
+
+def discard_upload_job(job, video_path):
+    """Remove a job whose video never finished uploading"""
+    shutil.rmtree(os.path.dirname(video_path), ignore_errors=True)
+    db.session.delete(job)
+    db.session.commit()
+
+def hash_stream(src, chunk_size):
+    """Content hash of the rest of src; identifies a video for the artifact cache"""
+    digest = hashlib.blake2b()
+    for chunk in iter(lambda: src.read(chunk_size), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_file(path):
+    with open(path, 'rb') as f:
+        return hash_stream(f, app.config['UPLOAD_CHUNK_SIZE'])
+
+def save_upload(src, path):
+    """Copy an upload stream to path in UPLOAD_CHUNK_SIZE blocks and return its content hash.
+    Each block is hashed as it is written, so the upload is read only once.
+    """
+    chunk_size = app.config['UPLOAD_CHUNK_SIZE']
+    digest = hashlib.blake2b()
+    with open(path, 'wb', buffering=0) as out:
+        for chunk in iter(lambda: src.read(chunk_size), b''):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+def nginx_body_file():
+    """Path of the request body nginx already saved to disk (X-File header), or None"""
+    upload_dir = app.config['NGINX_UPLOAD_DIR']
+    body_file = request.headers.get('X-File')
+    if not upload_dir or not body_file:
+        return None
+    
+    upload_dir = os.path.realpath(upload_dir)
+    body_file = os.path.realpath(body_file)
+    if os.path.commonpath([upload_dir, body_file]) != upload_dir or not os.path.isfile(body_file):
+        abort(400)
+    return body_file
+
+def adopt_upload(body_file, path):
+    """Move a body file saved by nginx into place; a rename when both are on one filesystem"""
+    try:
+        os.rename(body_file, path)
+    except OSError:
+        shutil.move(body_file, path)
+
+def read_form_from(body_file):
+    """Have request.files parse the multipart body nginx saved instead of the (empty) request stream"""
+    body = open(body_file, 'rb')
+    request.environ['wsgi.input'] = body
+    request.environ['CONTENT_LENGTH'] = str(os.path.getsize(body_file))
+    
+    @after_this_request
+    def close_body(response):
+        body.close()
+        return response
+
+def start_processing(job, video_path, video_hash):
+    """Record the saved video and its content hash on the job and start processing it"""
+    job.video_path = video_path
+    job.video_hash = video_hash
+    db.session.commit()
+    job_id = job.id
+    
+    if app.config['CELERY_BROKER_URL']:
+        from tasks import process_job
+        process_job.apply_async(args=[job_id], queue=app.config['CELERY_QUEUE'])
+        return
+    
+    # No task queue configured: process in a background thread (pass app so worker threads get valid context)
+    def process_in_background():
+        with app.app_context():
+            try:
+                orchestrator = get_orchestrator()
+                orchestrator.process_job(job_id, flask_app=app)
+            except Exception as e:
+                app.logger.exception(f"Job {job_id} processing error: {e}")
+    
+    thread = threading.Thread(target=process_in_background, daemon=True)
+    thread.start()
+
+def upload_stream():
+    """Stream a raw request body (POST /upload?filename=...) straight to disk.
+    Skips werkzeug's multipart parser and its temporary spool file.
+    """
+    filename = secure_filename(request.args.get('filename', ''))
+    if not filename:
+        return jsonify({'error': 'No file selected.'}), 400
+    if not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Allowed: mp4, avi, mov, mkv, webm'}), 400
+    
+    body_file = nginx_body_file()
+    job, video_path = create_upload_job(get_current_user_id())
+    
+    try:
+        if body_file:
+            adopt_upload(body_file, video_path)
+            # nginx wrote the file, so it has not passed through here to be hashed on the way
+            video_hash = hash_file(video_path)
+        else:
+            video_hash = save_upload(request.stream, video_path)
+    except Exception:
+        discard_upload_job(job, video_path)
+        raise
+    
+    if os.path.getsize(video_path) == 0:
+        discard_upload_job(job, video_path)
+        return jsonify({'error': 'No video file provided.'}), 400
+    
+    start_processing(job, video_path, video_hash)
+    
+    flash(f'Video uploaded successfully! Job ID: {job.id}. Processing started.', 'success')
+    return jsonify({'job_id': job.id, 'redirect': url_for('job_status', job_id=job.id)})
+
 @app.route('/upload', methods=['GET', 'POST'])
 @login_required
 def upload():
     """Upload lecture video"""
     if request.method == 'POST':
+        if request.mimetype != 'multipart/form-data':
+            return upload_stream()
+        
+        body_file = nginx_body_file()
+        if body_file:
+            read_form_from(body_file)
+        
         if 'video' not in request.files:
             flash('No video file provided.', 'error')
             return redirect(request.url)
@@ -143,37 +342,9 @@ def upload():
             flash('Invalid file type. Allowed: mp4, avi, mov, mkv, webm', 'error')
             return redirect(request.url)
         
-        user = get_current_user()
-        
-        # Create job entry
-        job = Job(user_id=user.id, video_path='')
-        db.session.add(job)
-        db.session.commit()
-        
-        # Create storage directory
-        storage_path = os.path.join(app.config['UPLOAD_FOLDER'], f'job_{job.id}')
-        os.makedirs(storage_path, exist_ok=True)
-        
-        # Save video file
-        filename = secure_filename(file.filename)
-        video_path = os.path.join(storage_path, 'video.mp4')
-        file.save(video_path)
-        
-        # Update job with video path
-        job.video_path = video_path
-        db.session.commit()
-        
-        # Start processing in background thread (pass app so worker threads get valid context)
-        def process_in_background():
-            with app.app_context():
-                try:
-                    orchestrator = get_orchestrator()
-                    orchestrator.process_job(job.id, flask_app=app)
-                except Exception as e:
-                    app.logger.exception(f"Job {job.id} processing error: {e}")
-        
-        thread = threading.Thread(target=process_in_background, daemon=True)
-        thread.start()
+        job, video_path = create_upload_job(get_current_user_id())
+        video_hash = save_upload(file.stream, video_path)
+        start_processing(job, video_path, video_hash)
         
         flash(f'Video uploaded successfully! Job ID: {job.id}. Processing started.', 'success')
         return redirect(url_for('job_status', job_id=job.id))
@@ -184,18 +355,18 @@ def upload():
 @login_required
 def jobs():
     """List all jobs for current user"""
-    user = get_current_user()
-    jobs = Job.query.filter_by(user_id=user.id).order_by(Job.created_at.desc()).all()
+    user_id = get_current_user_id()
+    jobs = db.session.execute(job_list_query(user_id)).mappings().all()
     return render_template('jobs.html', jobs=jobs)
 
 @app.route('/jobs/<int:job_id>')
 @login_required
 def job_status(job_id):
     """View job status"""
-    user = get_current_user()
-    job = Job.query.get_or_404(job_id)
+    user_id = get_current_user_id()
+    job = db.get_or_404(Job, job_id)
     
-    if job.user_id != user.id:
+    if job.user_id != user_id:
         flash('Access denied.', 'error')
         return redirect(url_for('jobs'))
     
@@ -205,10 +376,10 @@ def job_status(job_id):
 @login_required
 def job_cancel(job_id):
     """Cancel a pending or in-progress job"""
-    user = get_current_user()
-    job = Job.query.get_or_404(job_id)
+    user_id = get_current_user_id()
+    job = db.get_or_404(Job, job_id)
     
-    if job.user_id != user.id:
+    if job.user_id != user_id:
         flash('Access denied.', 'error')
         return redirect(url_for('jobs'))
     
@@ -219,6 +390,9 @@ def job_cancel(job_id):
     job.final_status = 'cancelled'
     job.status_message = 'Cancelled by user'
     db.session.commit()
+    # Aborts the job's OCR/Whisper requests if it runs in this process; on a Celery worker its
+    # watchdog sees the new status within a second and aborts them there
+    signal_cancel(job_id)
     flash('Job cancelled.', 'success')
     return redirect(url_for('job_status', job_id=job_id))
 
@@ -226,13 +400,70 @@ def job_cancel(job_id):
 @login_required
 def api_job_status(job_id):
     """API endpoint for job status"""
-    user = get_current_user()
-    job = Job.query.get_or_404(job_id)
+    user_id = get_current_user_id()
+    # Polled often: read the precomputed snapshot instead of hydrating a Job
+    job = db.session.query(Job.id, Job.user_id, Job.updated_at, Job.status_snapshot)\
+        .filter_by(id=job_id).first()
+    if job is None:
+        abort(404)
+    
+    if job.user_id != user_id:
+        return jsonify({'error': 'Access denied'}), 403
     
-    if job.user_id != user.id:
+    # Every status change bumps updated_at, so it identifies the payload
+    etag = f"job-{job.id}-{job.updated_at.timestamp() if job.updated_at else 0}"
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    elif job.status_snapshot:
+        response = app.response_class(job.status_snapshot, mimetype='application/json')
+    else:
+        # Jobs not updated since they were created have no snapshot yet
+        response = jsonify(db.session.get(Job, job_id).to_dict())
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/jobs/<int:job_id>/events')
+@login_required
+def api_job_events(job_id):
+    """Server-Sent Events stream of job status, sent whenever the job changes"""
+    user_id = get_current_user_id()
+    owner_id = db.session.query(Job.user_id).filter_by(id=job_id).scalar()
+    if owner_id is None:
+        abort(404)
+    if owner_id != user_id:
         return jsonify({'error': 'Access denied'}), 403
     
-    return jsonify(job.to_dict())
+    # Subscribe before reading the current status so no change falls in between
+    subscription = job_events.subscribe(job_id)
+    heartbeat = app.config['JOB_EVENTS_HEARTBEAT']
+    
+    def read_status():
+        status = db.session.get(Job, job_id).to_dict()
+        # End the read transaction so the next read sees new commits
+        db.session.close()
+        return status
+    
+    def stream():
+        try:
+            status = read_status()
+            yield f"data: {app.json.dumps(status)}\n\n"
+            while status['final_status'] not in Job.FINAL_STATES:
+                update = subscription.get(timeout=heartbeat)
+                if update is None:
+                    # Quiet period: re-check in case an update was published elsewhere
+                    update = read_status()
+                    if update == status:
+                        yield ": keepalive\n\n"
+                        continue
+                status = update
+                yield f"data: {app.json.dumps(status)}\n\n"
+        finally:
+            subscription.close()
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/services/status')
 @login_required
@@ -253,69 +484,99 @@ def api_services_status():
 @login_required
 def lecture_view(lecture_id):
     """View lecture notes"""
-    user = get_current_user()
-    lecture = Lecture.query.get_or_404(lecture_id)
+    user_id = get_current_user_id()
+    lecture = get_lecture_with_job(lecture_id)
     job = lecture.job
     
-    if job.user_id != user.id:
+    if job.user_id != user_id:
         flash('Access denied.', 'error')
         return redirect(url_for('jobs'))
     
+    # Finished lectures don't change, so a browser revalidating its copy gets a 304 without
+    # the files being read or the page rendered. Pages that would show pending flash
+    # messages are not cached.
+    etag = None
+    if job.is_complete() and '_flashes' not in session:
+        etag = lecture_etag(lecture)
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+            set_lecture_cache_headers(response, etag)
+            return response
+    
     notes_data = None
     transcript_data = None
     
     if lecture.notes_path and os.path.exists(lecture.notes_path):
-        with open(lecture.notes_path, 'r') as f:
-            notes_data = json.load(f)
+        notes_data = load_json(lecture.notes_path)
     
     if lecture.transcript_path and os.path.exists(lecture.transcript_path):
-        with open(lecture.transcript_path, 'r') as f:
-            transcript_data = json.load(f)
+        transcript_data = load_json(lecture.transcript_path)
     
-    return render_template('lecture_view.html', 
-                         lecture=lecture, 
-                         job=job,
-                         notes=notes_data,
-                         transcript=transcript_data)
+    response = make_response(render_template('lecture_view.html', 
+                                             lecture=lecture, 
+                                             job=job,
+                                             notes=notes_data,
+                                             transcript=transcript_data))
+    if etag:
+        set_lecture_cache_headers(response, etag)
+    return response
 
 @app.route('/lectures/<int:lecture_id>/chat', methods=['GET', 'POST'])
 @login_required
 def lecture_chat(lecture_id):
     """Chat interface for lecture"""
-    user = get_current_user()
-    lecture = Lecture.query.get_or_404(lecture_id)
-    job = lecture.job
-    
-    if job.user_id != user.id:
-        flash('Access denied.', 'error')
-        return redirect(url_for('jobs'))
+    user_id = get_current_user_id()
     
     if request.method == 'POST':
+        if get_lecture_owner_id(lecture_id) != user_id:
+            flash('Access denied.', 'error')
+            return redirect(url_for('jobs'))
+        
         question = request.form.get('question') or request.json.get('question')
         if not question:
             return jsonify({'error': 'Question required'}), 400
         
         try:
             chat_service = get_chat_service()
-            answer = chat_service.ask_question(lecture_id, user.id, question)
+            answer = chat_service.ask_question(lecture_id, user_id, question)
             return jsonify({'answer': answer})
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
     # GET request - show chat page
+    lecture = get_lecture_with_job(lecture_id)
+    job = lecture.job
+    
+    if job.user_id != user_id:
+        flash('Access denied.', 'error')
+        return redirect(url_for('jobs'))
+    
     chat_service = get_chat_service()
     chat_history = chat_service.get_chat_history(lecture_id)
     return render_template('chat.html', lecture=lecture, job=job, chat_history=chat_history)
 
+def stream_chat_answer(chat_service, lecture_id, user_id, question):
+    """Server-Sent Events response relaying the answer token by token"""
+    def stream():
+        try:
+            for token in chat_service.ask_question_stream(lecture_id, user_id, question):
+                yield f"data: {app.json.dumps({'token': token})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {app.json.dumps({'error': str(e)})}\n\n"
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/lectures/<int:lecture_id>/chat', methods=['POST'])
 @login_required
 def api_chat(lecture_id):
     """API endpoint for chat"""
-    user = get_current_user()
-    lecture = Lecture.query.get_or_404(lecture_id)
-    job = lecture.job
+    user_id = get_current_user_id()
     
-    if job.user_id != user.id:
+    if get_lecture_owner_id(lecture_id) != user_id:
         return jsonify({'error': 'Access denied'}), 403
     
     data = request.json
@@ -324,9 +585,12 @@ def api_chat(lecture_id):
     if not question:
         return jsonify({'error': 'Question required'}), 400
     
+    chat_service = get_chat_service()
+    if request.accept_mimetypes.best_match(['application/json', 'text/event-stream']) == 'text/event-stream':
+        return stream_chat_answer(chat_service, lecture_id, user_id, question)
+    
     try:
-        chat_service = get_chat_service()
-        answer = chat_service.ask_question(lecture_id, user.id, question)
+        answer = chat_service.ask_question(lecture_id, user_id, question)
         return jsonify({'answer': answer})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
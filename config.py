@@ -10,16 +10,34 @@ class Config:
     OCR_SERVICE_URL = os.environ.get('OCR_SERVICE_URL') or 'http://localhost:5001'
     WHISPER_SERVICE_URL = os.environ.get('WHISPER_SERVICE_URL') or 'http://localhost:5002'
     LLM_SERVICE_URL = os.environ.get('LLM_SERVICE_URL') or 'http://localhost:5003'
+    # Optional service that takes the video once and returns {'ocr': ..., 'transcript': ...}.
+    # When set, it replaces the separate OCR and Whisper uploads.
+    COMBINED_SERVICE_URL = os.environ.get('COMBINED_SERVICE_URL')
     
     # Service timeout settings (in seconds)
     SERVICE_TIMEOUT = int(os.environ.get('SERVICE_TIMEOUT', '300'))
-    POLL_INTERVAL = int(os.environ.get('POLL_INTERVAL', '5'))
-    MAX_POLL_ATTEMPTS = int(os.environ.get('MAX_POLL_ATTEMPTS', '120'))
+    # OCR/Whisper requests in flight at once across all jobs in this process
+    MAX_PARALLEL_STAGES = int(os.environ.get('MAX_PARALLEL_STAGES', '4'))
+    
+    # Job status events: Redis pub/sub carries them across processes (e.g. from Celery
+    # workers); without it they only reach this process. Streams re-check the
+    # database after JOB_EVENTS_HEARTBEAT quiet seconds.
+    REDIS_URL = os.environ.get('REDIS_URL')
+    JOB_EVENTS_HEARTBEAT = int(os.environ.get('JOB_EVENTS_HEARTBEAT', '15'))
+    
+    # Task queue (Celery). Leave unset to process jobs in a background thread.
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or REDIS_URL
+    CELERY_QUEUE = os.environ.get('CELERY_QUEUE', 'default')
     
     # File upload settings (500MB max)
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 500 * 1024 * 1024))
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'storage'
     ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
+    ALLOWED_SUFFIXES = tuple(sorted('.' + ext for ext in ALLOWED_EXTENSIONS))
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+    # Directory nginx writes request bodies to (client_body_temp_path) when it fronts /upload
+    # and passes the body file in X-File. Leave unset unless nginx is configured that way.
+    NGINX_UPLOAD_DIR = os.environ.get('NGINX_UPLOAD_DIR')
     
     # Chat settings
     CHAT_TIMEOUT = int(os.environ.get('CHAT_TIMEOUT', '60'))
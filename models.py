@@ -1,9 +1,33 @@
+import sqlite3
 from datetime import datetime
+import orjson
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from werkzeug.security import check_password_hash
 
 db = SQLAlchemy()
 
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets status polls read while the orchestrator writes job updates"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+# Shared Argon2id hasher; costs tuned for interactive logins
+password_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=2)
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -17,10 +41,21 @@ class User(db.Model):
     chats = db.relationship('Chat', backref='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not self.password_hash.startswith('$argon2'):
+            # Werkzeug hash from before the switch to Argon2
+            return check_password_hash(self.password_hash, password)
+        try:
+            return password_hasher.verify(self.password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    
+    def password_needs_rehash(self):
+        if not self.password_hash.startswith('$argon2'):
+            return True
+        return password_hasher.check_needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -32,6 +67,9 @@ class User(db.Model):
 
 class Job(db.Model):
     __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -41,23 +79,34 @@ class Job(db.Model):
     llm_status = db.Column(db.String(20), default='pending')
     final_status = db.Column(db.String(20), default='pending')
     status_message = db.Column(db.Text, nullable=True)
+    # to_dict() as JSON, rewritten on every update so status reads need no serialization
+    status_snapshot = db.Column(db.Text, nullable=True)
+    # BLAKE2b of the video, used to look up stage results in ArtifactCache
+    video_hash = db.Column(db.String(128), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     lecture = db.relationship('Lecture', backref='job', uselist=False, lazy=True)
     
+    FINAL_STATES = ('done', 'failed', 'cancelled')
+    
     def to_dict(self):
+        return Job.status_dict(self)
+    
+    @staticmethod
+    def status_dict(job):
+        """Status fields of a Job, or of a row selected from the jobs table"""
         return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'video_path': self.video_path,
-            'ocr_status': self.ocr_status,
-            'whisper_status': self.whisper_status,
-            'llm_status': self.llm_status,
-            'final_status': self.final_status,
-            'status_message': self.status_message,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'id': job.id,
+            'user_id': job.user_id,
+            'video_path': job.video_path,
+            'ocr_status': job.ocr_status,
+            'whisper_status': job.whisper_status,
+            'llm_status': job.llm_status,
+            'final_status': job.final_status,
+            'status_message': job.status_message,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'updated_at': job.updated_at.isoformat() if job.updated_at else None
         }
     
     def is_complete(self):
@@ -75,10 +124,34 @@ class Job(db.Model):
                 self.llm_status in ['running', 'pending'])
     
     def can_cancel(self):
-        if self.final_status in ('done', 'failed', 'cancelled'):
+        if self.final_status in Job.FINAL_STATES:
             return False
         return True
 
+def _has_changes(job):
+    session = object_session(job)
+    return session is None or session.is_modified(job, include_collections=False)
+
+@event.listens_for(Job, 'before_update')
+def _touch_updated_at(mapper, connection, job):
+    # Set updated_at here rather than via onupdate so the snapshot includes it
+    if _has_changes(job):
+        job.updated_at = datetime.utcnow()
+
+@event.listens_for(Job, 'after_update')
+def _write_status_snapshot(mapper, connection, job):
+    """Snapshot the row as it stands after this update. The session's copy of the columns the
+    update didn't set can be stale, since OCR and Whisper commit from separate sessions; the
+    update holds the row's write lock, so no other writer can change it before the commit.
+    """
+    if not _has_changes(job):
+        return
+    jobs = Job.__table__
+    row = connection.execute(select(jobs).where(jobs.c.id == job.id)).one()
+    snapshot = orjson.dumps(Job.status_dict(row)).decode()
+    connection.execute(jobs.update().where(jobs.c.id == job.id).values(status_snapshot=snapshot))
+    set_committed_value(job, 'status_snapshot', snapshot)
+
 class Lecture(db.Model):
     __tablename__ = 'lectures'
     
@@ -99,8 +172,27 @@ class Lecture(db.Model):
             'transcript_path': self.transcript_path
         }
 
+class ArtifactCache(db.Model):
+    """Where an earlier job stored a stage result for a video, by the video's content hash
+    and the service that produced it"""
+    __tablename__ = 'artifact_cache'
+    __table_args__ = (
+        db.Index('ix_artifact_cache_lookup', 'video_hash', 'kind', 'source'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    video_hash = db.Column(db.String(128), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'ocr' or 'transcript'
+    # Service URL(s) the result came from, so changing OCR/Whisper/combined URLs skips old results
+    source = db.Column(db.String(500), nullable=False, default='')
+    path = db.Column(db.String(500), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Chat(db.Model):
     __tablename__ = 'chats'
+    __table_args__ = (
+        db.Index('ix_chats_lecture_created', 'lecture_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     lecture_id = db.Column(db.Integer, db.ForeignKey('lectures.id'), nullable=False)
@@ -1,68 +1,149 @@
 import os
-import json
+from functools import lru_cache
+import orjson
 import requests
 from flask import current_app
 from models import db, Chat, Lecture
+from services.http import session, split_urls, with_failover
+from services.json_utils import load_json, response_json
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+def _file_signature(path):
+    """(mtime_ns, size) of a file, or None when it does not exist"""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+@lru_cache(maxsize=64)
+def _context_json(summary, notes_path, notes_signature, transcript_path, transcript_signature):
+    # The signatures are only part of the key, so edited files are picked up again
+    context = {
+        'summary': summary or '',
+        'notes': load_json(notes_path) if notes_signature else None,
+        'transcript': load_json(transcript_path) if transcript_signature else None
+    }
+    return orjson.dumps(context)
 
 class ChatService:
     """Handles chat interactions with LLM service"""
     
-    def __init__(self):
-        self.llm_url = current_app.config['LLM_SERVICE_URL']
-        self.timeout = current_app.config['CHAT_TIMEOUT']
+    DEFAULT_ANSWER = 'Sorry, I could not generate a response.'
+    
+    def __init__(self, app=None):
+        config = (app or current_app).config
+        self.llm_urls = split_urls(config['LLM_SERVICE_URL'])
+        self.timeout = config['CHAT_TIMEOUT']
     
-    def _make_request(self, url, data):
-        """Make HTTP request to LLM service"""
+    def _request_error(self, e):
+        """Map a requests exception to the error reported to the user"""
+        if isinstance(e, requests.exceptions.Timeout):
+            return Exception("Chat service timeout")
+        if isinstance(e, requests.exceptions.ConnectionError):
+            return Exception("Chat service unavailable")
+        if isinstance(e, requests.exceptions.HTTPError):
+            return Exception(f"HTTP error from chat service: {str(e)}")
+        return Exception(f"Error calling chat service: {str(e)}")
+    
+    def _make_request(self, path, data):
+        """POST to path on the LLM service, failing over between its URLs"""
         try:
-            response = requests.post(url, json=data, timeout=self.timeout)
+            response = with_failover(
+                [f"{base}{path}" for base in self.llm_urls],
+                lambda url: session.post(url, data=data, headers=JSON_HEADERS, timeout=self.timeout),
+                current_app.logger)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.Timeout:
-            raise Exception("Chat service timeout")
-        except requests.exceptions.ConnectionError:
-            raise Exception("Chat service unavailable")
-        except requests.exceptions.HTTPError as e:
-            raise Exception(f"HTTP error from chat service: {str(e)}")
+            return response_json(response)
         except Exception as e:
-            raise Exception(f"Error calling chat service: {str(e)}")
+            raise self._request_error(e)
+    
+    def _stream_request(self, path, data):
+        """POST to the LLM service and yield the answer as it arrives.
+        
+        A text/event-stream reply is read one `data:` line at a time until
+        `data: [DONE]`; any other reply is treated as the usual JSON answer
+        and yielded in one piece.
+        """
+        try:
+            headers = dict(JSON_HEADERS, Accept='text/event-stream, application/json')
+            response = with_failover(
+                [f"{base}{path}" for base in self.llm_urls],
+                lambda url: session.post(url, data=data, headers=headers, timeout=self.timeout, stream=True),
+                current_app.logger)
+            with response:
+                response.raise_for_status()
+                if not response.headers.get('Content-Type', '').startswith('text/event-stream'):
+                    yield response_json(response).get('answer', '')
+                    return
+                # Event streams are always UTF-8; without a charset requests would guess ISO-8859-1
+                response.encoding = 'utf-8'
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    chunk = line[5:].strip()
+                    if chunk == '[DONE]':
+                        break
+                    try:
+                        event = orjson.loads(chunk)
+                    except orjson.JSONDecodeError:
+                        yield chunk
+                        continue
+                    yield event.get('token', '') if isinstance(event, dict) else str(event)
+        except Exception as e:
+            raise self._request_error(e)
     
     def _load_lecture_context(self, lecture_id):
-        """Load lecture notes and transcript for context"""
-        lecture = Lecture.query.get(lecture_id)
+        """Lecture notes and transcript for context, as serialized JSON.
+        Reused across questions until the lecture's files change on disk."""
+        lecture = db.session.query(Lecture.summary, Lecture.notes_path, Lecture.transcript_path)\
+            .filter_by(id=lecture_id)\
+            .first()
         if not lecture:
             raise ValueError(f"Lecture {lecture_id} not found")
         
-        context = {
-            'summary': lecture.summary or '',
-            'notes': None,
-            'transcript': None
-        }
-        
-        if lecture.notes_path and os.path.exists(lecture.notes_path):
-            with open(lecture.notes_path, 'r') as f:
-                context['notes'] = json.load(f)
-        
-        if lecture.transcript_path and os.path.exists(lecture.transcript_path):
-            with open(lecture.transcript_path, 'r') as f:
-                context['transcript'] = json.load(f)
-        
-        return context
+        return _context_json(
+            lecture.summary,
+            lecture.notes_path, _file_signature(lecture.notes_path),
+            lecture.transcript_path, _file_signature(lecture.transcript_path)
+        )
     
     def _get_conversation_history(self, lecture_id, limit=10):
         """Get recent conversation history for context"""
-        chats = Chat.query.filter_by(lecture_id=lecture_id)\
-            .order_by(Chat.created_at.desc())\
+        # Newest `limit` rows, returned oldest-first by the database
+        recent = db.session.query(Chat.id, Chat.question, Chat.answer, Chat.created_at)\
+            .filter_by(lecture_id=lecture_id)\
+            .order_by(Chat.created_at.desc(), Chat.id.desc())\
             .limit(limit)\
-            .all()
-        
-        history = []
-        for chat in reversed(chats):
-            history.append({
-                'question': chat.question,
-                'answer': chat.answer
-            })
+            .subquery()
+        rows = db.session.query(recent.c.question, recent.c.answer)\
+            .order_by(recent.c.created_at.asc(), recent.c.id.asc())
         
-        return history
+        return [{'question': question, 'answer': answer} for question, answer in rows]
+    
+    def _build_chat_payload(self, lecture_id, question):
+        """Serialized request body for the LLM /chat endpoint"""
+        context = self._load_lecture_context(lecture_id)
+        payload = orjson.dumps({
+            'lecture_id': str(lecture_id),
+            'question': question,
+            'history': self._get_conversation_history(lecture_id)
+        })
+        # Splice in the cached context bytes rather than serializing it again
+        return payload[:-1] + b',"context":' + context + b'}'
+    
+    def _save_chat(self, lecture_id, user_id, question, answer):
+        chat = Chat(
+            lecture_id=lecture_id,
+            user_id=user_id,
+            question=question,
+            answer=answer
+        )
+        db.session.add(chat)
+        # Committed inline so the next question's history includes this turn.
+        # With SQLite in WAL mode and synchronous=NORMAL this does not fsync.
+        db.session.commit()
     
     def ask_question(self, lecture_id, user_id, question):
         """Process a user question and return answer"""
@@ -70,31 +151,36 @@ class ChatService:
             raise ValueError("Question cannot be empty")
         
         try:
-            context = self._load_lecture_context(lecture_id)
-            history = self._get_conversation_history(lecture_id)
+            chat_payload = self._build_chat_payload(lecture_id, question)
             
-            chat_payload = {
-                'lecture_id': str(lecture_id),
-                'question': question,
-                'context': context,
-                'history': history
-            }
+            result = self._make_request('/chat', chat_payload)
             
-            chat_endpoint = f"{self.llm_url}/chat"
-            result = self._make_request(chat_endpoint, chat_payload)
+            answer = result.get('answer', self.DEFAULT_ANSWER)
+            self._save_chat(lecture_id, user_id, question, answer)
             
-            answer = result.get('answer', 'Sorry, I could not generate a response.')
+            return answer
+        except Exception as e:
+            raise Exception(f"Failed to process question: {str(e)}")
+    
+    def ask_question_stream(self, lecture_id, user_id, question):
+        """Process a user question, yielding the answer in pieces as the LLM produces them.
+        The chat is saved once the answer is complete."""
+        if not question or not question.strip():
+            raise ValueError("Question cannot be empty")
+        
+        try:
+            chat_payload = self._build_chat_payload(lecture_id, question)
             
-            chat = Chat(
-                lecture_id=lecture_id,
-                user_id=user_id,
-                question=question,
-                answer=answer
-            )
-            db.session.add(chat)
-            db.session.commit()
+            parts = []
+            for token in self._stream_request('/chat', chat_payload):
+                if token:
+                    parts.append(token)
+                    yield token
             
-            return answer
+            if not parts:
+                parts.append(self.DEFAULT_ANSWER)
+                yield self.DEFAULT_ANSWER
+            self._save_chat(lecture_id, user_id, question, ''.join(parts))
         except Exception as e:
             raise Exception(f"Failed to process question: {str(e)}")
     
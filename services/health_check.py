@@ -1,16 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 from flask import current_app
+from services.http import session, split_urls
 
 HEALTH_CHECK_TIMEOUT = 5
 
-def _strip_trailing_slash(url):
-    return url.rstrip('/') if url else url
+# Every URL of every service is pinged at once, so a check takes at most one
+# HEALTH_CHECK_TIMEOUT while there are no more URLs than workers
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='health-check')
+
+def _submit_pings(base_url, path="/"):
+    return [_executor.submit(_ping, url + path) for url in split_urls(base_url)]
+
+def _first_up(futures):
+    """('up', ...) as soon as any ping answers, else the status of the last one to fail"""
+    status = ("down", "No URL set")
+    for future in as_completed(futures):
+        status = future.result()
+        if status[0] == "up":
+            break
+    return status
 
 def check_service(name, base_url, path="/"):
-    """Ping a service; returns (status, message). status is 'up' or 'down'."""
-    url = _strip_trailing_slash(base_url) + path
+    """Ping a service; returns (status, message). status is 'up' or 'down'.
+    base_url may list several comma-separated failover URLs, pinged in parallel; the service is up if any answers."""
+    return _first_up(_submit_pings(base_url, path))
+
+def _ping(url):
     try:
-        r = requests.get(url, timeout=HEALTH_CHECK_TIMEOUT)
+        r = session.get(url, timeout=HEALTH_CHECK_TIMEOUT)
         r.raise_for_status()
         return ("up", "Running")
     except requests.exceptions.Timeout:
@@ -25,17 +43,24 @@ def check_service(name, base_url, path="/"):
 def check_all_services():
     """Check OCR, Whisper, LLM. Returns dict with status and message per service."""
     cfg = current_app.config
-    ocr_url = cfg.get("OCR_SERVICE_URL") or ""
-    whisper_url = cfg.get("WHISPER_SERVICE_URL") or ""
+    # When configured, the combined service handles both OCR and Whisper
+    combined_url = cfg.get("COMBINED_SERVICE_URL") or ""
+    ocr_url = combined_url or cfg.get("OCR_SERVICE_URL") or ""
+    whisper_url = combined_url or cfg.get("WHISPER_SERVICE_URL") or ""
     llm_url = cfg.get("LLM_SERVICE_URL") or ""
 
-    ocr_status, ocr_msg = check_service("OCR", ocr_url) if ocr_url else ("down", "No URL set")
-    whisper_status, whisper_msg = check_service("Whisper", whisper_url) if whisper_url else ("down", "No URL set")
-    llm_status, llm_msg = check_service("LLM", llm_url) if llm_url else ("down", "No URL set")
+    # Submit all pings before waiting on any
+    ocr_pings = _submit_pings(ocr_url)
+    whisper_pings = _submit_pings(whisper_url)
+    llm_pings = _submit_pings(llm_url)
+
+    ocr_status, ocr_msg = _first_up(ocr_pings)
+    whisper_status, whisper_msg = _first_up(whisper_pings)
+    llm_status, llm_msg = _first_up(llm_pings)
 
     return {
-        "ocr": {"status": ocr_status, "message": ocr_msg, "url": _strip_trailing_slash(ocr_url) or None},
-        "whisper": {"status": whisper_status, "message": whisper_msg, "url": _strip_trailing_slash(whisper_url) or None},
-        "llm": {"status": llm_status, "message": llm_msg, "url": _strip_trailing_slash(llm_url) or None},
+        "ocr": {"status": ocr_status, "message": ocr_msg, "url": ", ".join(split_urls(ocr_url)) or None},
+        "whisper": {"status": whisper_status, "message": whisper_msg, "url": ", ".join(split_urls(whisper_url)) or None},
+        "llm": {"status": llm_status, "message": llm_msg, "url": ", ".join(split_urls(llm_url)) or None},
         "all_up": ocr_status == "up" and whisper_status == "up" and llm_status == "up",
     }
@@ -0,0 +1,147 @@
+import socket
+import threading
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError
+from urllib3.util.retry import Retry
+
+def split_urls(value):
+    """Service URLs from a setting that may list several, comma-separated, for failover"""
+    return [url.strip().rstrip('/') for url in (value or '').split(',') if url.strip()]
+
+def _nothing_sent(e):
+    """Whether a requests error happened before any of the request was sent: the connection,
+    or its TLS handshake, failed. A connection dropped later may have delivered the whole body."""
+    if isinstance(e, requests.exceptions.SSLError):
+        return True
+    reason = e.args[0] if e.args else None
+    return isinstance(reason, MaxRetryError) and isinstance(reason.reason, (NewConnectionError, ConnectTimeoutError))
+
+def with_failover(urls, send, logger=None):
+    """Return send(url) for the first URL that can be connected to.
+    Only errors raised before the request was sent move on to the next URL, so a request that may
+    have reached a service is never repeated at another; other errors, and the last URL's, are raised.
+    """
+    for index, url in enumerate(urls[:-1]):
+        try:
+            return send(url)
+        except requests.exceptions.ConnectionError as e:
+            if not _nothing_sent(e):
+                raise
+            if logger:
+                logger.warning(f"{url} unreachable ({e.__class__.__name__}), failing over to {urls[index + 1]}")
+    return send(urls[-1])
+
+class RequestCancelled(Exception):
+    pass
+
+# The CancelScope whose tracking() block the current thread is in
+_local = threading.local()
+
+class CancelScope:
+    """Lets any thread abort the requests made inside `with scope.tracking():`, even while they
+    are blocked sending a body or waiting for a reply. Requests must go through a session
+    built with cancellable=True.
+    """
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self._lock = threading.Lock()
+        self._connections = set()
+    
+    def is_cancelled(self):
+        return self.event.is_set()
+    
+    def cancel(self):
+        """Mark the scope cancelled and shut down the sockets of its requests in flight"""
+        self.event.set()
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            if connection.sock is not None:
+                try:
+                    connection.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+    
+    def _track(self, connection):
+        with self._lock:
+            self._connections.add(connection)
+        _local.connections.append(connection)
+        if self.is_cancelled():
+            raise RequestCancelled("Cancelled before the request was sent")
+    
+    @contextmanager
+    def tracking(self):
+        """Raises RequestCancelled if the scope is cancelled before the block finishes;
+        failures caused by the aborted sockets are raised as RequestCancelled too.
+        """
+        _local.scope = self
+        _local.connections = []
+        try:
+            yield
+        except Exception as e:
+            if self.is_cancelled() and not isinstance(e, RequestCancelled):
+                raise RequestCancelled("Cancelled while the request was in flight") from e
+            raise
+        finally:
+            with self._lock:
+                self._connections.difference_update(_local.connections)
+            _local.scope = None
+        if self.is_cancelled():
+            raise RequestCancelled("Cancelled after the response arrived")
+
+class _TrackedConnection:
+    """Registers itself with the current thread's CancelScope when it starts a request"""
+    
+    def request(self, *args, **kwargs):
+        scope = getattr(_local, 'scope', None)
+        if scope is not None:
+            scope._track(self)
+        return super().request(*args, **kwargs)
+
+class _TrackedHTTPConnection(_TrackedConnection, HTTPConnection):
+    pass
+
+class _TrackedHTTPSConnection(_TrackedConnection, HTTPSConnection):
+    pass
+
+class _TrackedHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _TrackedHTTPConnection
+
+class _TrackedHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _TrackedHTTPSConnection
+
+class _CancellableAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TrackedHTTPPool, 'https': _TrackedHTTPSPool}
+
+def build_session(pool_connections=10, pool_maxsize=20, max_retries=0, cancellable=False):
+    """Create a requests.Session that keeps connections to each host alive and pooled.
+    cancellable: let a CancelScope abort the session's requests in flight.
+    """
+    session = requests.Session()
+    session.headers['Connection'] = 'keep-alive'
+    adapter_cls = _CancellableAdapter if cancellable else HTTPAdapter
+    adapter = adapter_cls(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                          max_retries=max_retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Shared by chat and health-check calls. Read errors are not retried so a slow
+# LLM answer is never requested twice; connect errors are not retried so a health
+# check of a down service fails within one timeout and chat fails over at once.
+# Gateway errors only retry idempotent methods.
+session = build_session(max_retries=Retry(
+    total=3,
+    connect=0,
+    read=0,
+    backoff_factor=0.3,
+    status_forcelist=[502, 503, 504],
+    raise_on_status=False,
+))
@@ -0,0 +1,115 @@
+import json
+import queue
+import threading
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import Job
+
+class _LocalSubscription:
+    def __init__(self, broker, job_id):
+        self._broker = broker
+        self._job_id = job_id
+        self._queue = queue.Queue()
+
+    def get(self, timeout):
+        """Next status dict published for the job, or None after timeout seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker._unsubscribe(self._job_id, self)
+
+class _LocalBroker:
+    """In-process pub/sub, used when jobs run in a thread of the web process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, job_id, status):
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, ()))
+        for subscription in subscribers:
+            subscription._queue.put(status)
+
+    def subscribe(self, job_id):
+        subscription = _LocalSubscription(self, job_id)
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, job_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[job_id]
+
+class _RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def get(self, timeout):
+        """Next status dict published for the job, or None after timeout seconds"""
+        message = self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return json.loads(message['data']) if message else None
+
+    def close(self):
+        self._pubsub.close()
+
+class _RedisBroker:
+    """Redis pub/sub, so status changes made on Celery workers reach the web process"""
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, job_id, status):
+        self._client.publish(f'job:{job_id}', json.dumps(status))
+
+    def subscribe(self, job_id):
+        pubsub = self._client.pubsub()
+        pubsub.subscribe(f'job:{job_id}')
+        return _RedisSubscription(pubsub)
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+def _get_broker(app):
+    url = app.config.get('REDIS_URL')
+    with _brokers_lock:
+        if url not in _brokers:
+            _brokers[url] = _RedisBroker(url) if url else _LocalBroker()
+        return _brokers[url]
+
+def subscribe(job_id):
+    """Subscribe to status updates of a job; call close() on the result when done"""
+    return _get_broker(current_app).subscribe(job_id)
+
+# Runs after models._write_status_snapshot (registered first, when models was imported),
+# so it publishes the snapshot of the committed row rather than the session's possibly stale copy
+@event.listens_for(Job, 'after_update')
+def _collect_job_status(mapper, connection, job):
+    session = Session.object_session(job)
+    if session is not None and session.is_modified(job, include_collections=False):
+        session.info.setdefault('job_events', {})[job.id] = json.loads(job.status_snapshot)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_job_status(session):
+    pending = session.info.pop('job_events', None)
+    if not pending or not has_app_context():
+        return
+    broker = _get_broker(current_app)
+    for job_id, status in pending.items():
+        try:
+            broker.publish(job_id, status)
+        except Exception as e:
+            current_app.logger.warning(f"Could not publish status of job {job_id}: {e}")
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_job_status(session):
+    session.info.pop('job_events', None)
@@ -0,0 +1,46 @@
+import os
+from functools import lru_cache
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+@lru_cache(maxsize=32)
+def _load_json_cached(path, mtime_ns, size):
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
+def load_json(path):
+    """Load a JSON file, reusing the parsed result until the file changes on disk.
+    The returned object is shared between callers and must not be modified.
+    """
+    stat = os.stat(path)
+    return _load_json_cached(path, stat.st_mtime_ns, stat.st_size)
+
+def response_json(response):
+    """Decode a service response's JSON body; {} when it is empty.
+    Falls back to the stdlib decoder for NaN/Infinity, which Python services emit but orjson rejects.
+    """
+    if not response.content:
+        return {}
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return response.json()
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes with orjson instead of the stdlib json module"""
+    
+    sort_keys = False
+    
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        if kwargs:
+            # e.g. object_hook from Flask's session serializer, which orjson doesn't support
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
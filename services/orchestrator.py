@@ -1,174 +1,441 @@
 import os
-import json
-import time
+import socket
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait
+import orjson
 import requests
+import urllib3
+from requests_toolbelt.multipart.encoder import MultipartEncoder
 from datetime import datetime
 from flask import current_app
-from models import db, Job, Lecture
+from models import db, Job, Lecture, ArtifactCache
+from services.http import CancelScope, RequestCancelled, build_session, split_urls, with_failover
+from services.json_utils import response_json
+
+__all__ = ['OrchestratorService', 'signal_cancel']
+
+# Writes stage results to disk off the critical path; see start_llm_processing
+_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix='artifact-writer')
+
+def _write_json(path, data, indent=False):
+    """Write data as JSON; readers see the old file or the complete new one, never a partial write.
+    Compact unless indent is set: the files are only read back by code.
+    """
+    tmp_path = f'{path}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else None))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _save_result(path, data, writes=None):
+    """Write a stage result now, or in the background when a writes list is given.
+    Indented in debug mode; decided here because the writer threads have no app context.
+    """
+    indent = current_app.debug
+    if writes is None:
+        _write_json(path, data, indent)
+    else:
+        writes.append(_writer.submit(_write_json, path, data, indent))
+
+# How often a running job re-reads its status, to notice cancellations made by another process
+_CANCEL_POLL_SECONDS = 1
+
+# Cancels a running job's OCR/Whisper requests; keyed by job id, only while those stages run
+_cancel_scopes = {}
+_cancel_scopes_lock = threading.Lock()
+
+def signal_cancel(job_id):
+    """Abort a job's OCR/Whisper requests now if it runs in this process.
+    Jobs in other processes (Celery workers) are aborted by their watchdog within a second.
+    """
+    with _cancel_scopes_lock:
+        scope = _cancel_scopes.get(job_id)
+    if scope:
+        scope.cancel()
+
+class _CancellableReader:
+    """File wrapper that stops a streaming upload at the next chunk once the job is cancelled,
+    covering a cancel that lands while the connection is still being opened
+    """
+    
+    def __init__(self, file, scope):
+        self._file = file
+        self._scope = scope
+    
+    def read(self, *args):
+        if self._scope.is_cancelled():
+            raise RequestCancelled("Cancelled during upload")
+        return self._file.read(*args)
+    
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+def _read_json(path):
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
+def _is_timeout(e):
+    """Whether a ConnectionError came from the socket timing out, e.g. while sending the video"""
+    cause = e.args[0] if e.args else None
+    if isinstance(cause, urllib3.exceptions.MaxRetryError):
+        cause = cause.reason
+    if isinstance(cause, urllib3.exceptions.ProtocolError) and len(cause.args) > 1:
+        cause = cause.args[1]
+    # NewConnectionError subclasses ConnectTimeoutError but means the connection was refused
+    return (isinstance(cause, (socket.timeout, urllib3.exceptions.TimeoutError))
+            and not isinstance(cause, urllib3.exceptions.NewConnectionError))
+
+def _timeout_message(url, e):
+    return f"Service timeout (response took too long): {url}"
+
+def _ssl_message(url, e):
+    return (
+        f"SSL error talking to {url}. "
+        "Ensure the Colab notebook and ngrok tunnel are running; try again in a moment."
+    )
+
+def _connection_message(url, e):
+    if _is_timeout(e):
+        return (
+            f"Upload timed out while sending video to {url}. "
+            "Try a smaller video or increase SERVICE_TIMEOUT in .env (e.g. 1200 for 20 min)."
+        )
+    return (
+        f"Connection failed to {url}. "
+        "Check that the service (Colab + ngrok) is running and the URL in .env is correct."
+    )
+
+def _http_message(url, e):
+    return f"HTTP error from {url}: {str(e)}"
+
+# Looked up along the exception's MRO, so subclasses such as ConnectTimeout
+# (a ConnectionError before it is a Timeout) use the nearest entry; see _service_error
+_ERROR_MESSAGES = {
+    requests.exceptions.SSLError: _ssl_message,
+    requests.exceptions.ConnectionError: _connection_message,
+    requests.exceptions.Timeout: _timeout_message,
+    requests.exceptions.HTTPError: _http_message,
+}
+
+def _service_error(url, e, upload=False):
+    """Exception with a user-facing message for a failed call to url.
+    Only a video upload reports a timeout as the upload timing out; any other call reports it
+    as the service taking too long, whether it hit the connect, send or read timeout.
+    """
+    if not upload and (isinstance(e, requests.exceptions.Timeout)
+                       or isinstance(e, requests.exceptions.ConnectionError) and _is_timeout(e)):
+        return Exception(_timeout_message(url, e))
+    for cls in type(e).__mro__:
+        message = _ERROR_MESSAGES.get(cls)
+        if message:
+            return Exception(message(url, e))
+    return Exception(f"Error calling {url}: {str(e)}")
+
+@dataclass(frozen=True)
+class _JobPaths:
+    """Files of one job, built once and passed to each stage"""
+    storage: str
+    video: str
+    ocr_output: str
+    transcript: str
+    final_notes: str
+    
+    @classmethod
+    def for_job(cls, upload_folder, job_id):
+        storage = os.path.join(upload_folder, f'job_{job_id}')
+        return cls(
+            storage=storage,
+            video=os.path.join(storage, 'video.mp4'),
+            ocr_output=os.path.join(storage, 'ocr_output.json'),
+            transcript=os.path.join(storage, 'transcript.json'),
+            final_notes=os.path.join(storage, 'final_notes.json')
+        )
 
 class OrchestratorService:
     """Orchestrates processing across OCR, Whisper, and LLM services"""
     
-    def __init__(self):
-        def _strip_trailing_slash(url):
-            return url.rstrip('/') if url else url
-        self.ocr_url = _strip_trailing_slash(current_app.config['OCR_SERVICE_URL'])
-        self.whisper_url = _strip_trailing_slash(current_app.config['WHISPER_SERVICE_URL'])
-        self.llm_url = _strip_trailing_slash(current_app.config['LLM_SERVICE_URL'])
-        self.timeout = current_app.config['SERVICE_TIMEOUT']
-        self.poll_interval = current_app.config['POLL_INTERVAL']
-        self.max_poll_attempts = current_app.config['MAX_POLL_ATTEMPTS']
-        self.upload_folder = current_app.config['UPLOAD_FOLDER']
+    def __init__(self, app=None):
+        config = (app or current_app).config
+        # Each service may list several URLs; later ones are only used when earlier ones are unreachable
+        self.ocr_urls = split_urls(config['OCR_SERVICE_URL'])
+        self.whisper_urls = split_urls(config['WHISPER_SERVICE_URL'])
+        self.llm_urls = split_urls(config['LLM_SERVICE_URL'])
+        self.combined_urls = split_urls(config['COMBINED_SERVICE_URL'])
+        self.timeout = config['SERVICE_TIMEOUT']
+        self.upload_folder = config['UPLOAD_FOLDER']
+        # Kept for the life of the process: the service URLs are fixed, so each job's three
+        # calls reuse the pooled connections. No retries, so a video is never sent twice.
+        self._session = build_session(pool_connections=4, pool_maxsize=16, max_retries=0, cancellable=True)
+        # OCR/Whisper uploads from all jobs share this pool; its size caps how many run at once
+        self._stage_pool = ThreadPoolExecutor(max_workers=config['MAX_PARALLEL_STAGES'],
+                                              thread_name_prefix='stage')
     
-    def _make_request(self, url, method='GET', data=None, files=None):
-        """Make HTTP request to external service"""
-        try:
+    def _make_request(self, urls, method='GET', data=None, files=None):
+        """Make HTTP request to external service, failing over between its URLs"""
+        body = orjson.dumps(data) if method == 'POST' and not files else None
+        
+        def send(url):
             if method == 'GET':
-                response = requests.get(url, timeout=self.timeout)
+                return self._session.get(url, timeout=self.timeout)
             elif method == 'POST':
                 if files:
-                    response = requests.post(url, data=data, files=files, timeout=self.timeout)
-                else:
-                    response = requests.post(url, json=data, timeout=(30, self.timeout))
-            else:
-                raise ValueError(f"Unsupported method: {method}")
-            
+                    return self._session.post(url, data=data, files=files, timeout=self.timeout)
+                return self._session.post(url, data=body, headers={'Content-Type': 'application/json'},
+                                          timeout=(30, self.timeout))
+            raise ValueError(f"Unsupported method: {method}")
+        
+        url = ', '.join(urls)
+        try:
+            response = with_failover(urls, send, current_app.logger)
             response.raise_for_status()
-            return response.json() if response.content else {}
-        except requests.exceptions.Timeout:
-            raise Exception(f"Service timeout (response took too long): {url}")
-        except requests.exceptions.SSLError as e:
-            raise Exception(
-                f"SSL error talking to {url}. "
-                "Ensure the Colab notebook and ngrok tunnel are running; try again in a moment."
-            )
-        except requests.exceptions.ConnectionError as e:
-            err = str(e).lower()
-            if "timed out" in err or "timeout" in err:
-                raise Exception(
-                    f"Upload timed out while sending video to {url}. "
-                    "Try a smaller video or increase SERVICE_TIMEOUT in .env (e.g. 1200 for 20 min)."
-                )
-            raise Exception(
-                f"Connection failed to {url}. "
-                "Check that the service (Colab + ngrok) is running and the URL in .env is correct."
-            )
-        except requests.exceptions.HTTPError as e:
-            raise Exception(f"HTTP error from {url}: {str(e)}")
+            return response_json(response)
         except Exception as e:
-            raise Exception(f"Error calling {url}: {str(e)}")
+            raise _service_error(url, e)
     
-    def _post_with_files_retry(self, url, data, video_path, max_attempts=1):
-        """POST with file upload. No retries so we never send the video twice (avoids OCR/Whisper running twice)."""
-        last_error = None
-        for attempt in range(1, max_attempts + 1):
-            try:
-                with open(video_path, 'rb') as video_file:
-                    files = {'video': video_file}
-                    response = requests.post(url, data=data, files=files, timeout=self.timeout)
-                response.raise_for_status()
-                return response.json() if response.content else {}
-            except (requests.exceptions.SSLError, requests.exceptions.ConnectionError) as e:
-                last_error = e
-                if attempt < max_attempts:
-                    time.sleep(5)
-                    continue
-                if isinstance(e, requests.exceptions.SSLError):
-                    raise Exception(
-                        f"SSL error talking to {url}. "
-                        "Ensure the Colab notebook and ngrok tunnel are running; try again later."
-                    )
-                err = str(e).lower()
-                if "timed out" in err or "timeout" in err:
-                    raise Exception(
-                        f"Upload timed out while sending video to {url}. "
-                        "Try a smaller video or increase SERVICE_TIMEOUT in .env."
-                    )
-                raise Exception(
-                    f"Connection failed to {url}. "
-                    "Check that the service (Colab + ngrok) is running and the URL in .env is correct."
-                )
-            except requests.exceptions.Timeout:
-                raise Exception(f"Service timeout (response took too long): {url}")
-            except requests.exceptions.HTTPError as e:
-                raise Exception(f"HTTP error from {url}: {str(e)}")
-        raise last_error or Exception(f"Error calling {url}")
+    def _post_with_files_retry(self, urls, data, video_path, scope=None):
+        """POST with file upload, moving on to the next URL only when one cannot be connected to.
+        Never retried at the same URL so we never send the video twice (avoids OCR/Whisper running twice).
+        Cancelling scope aborts the request, during the upload or while waiting for the reply,
+        and raises RequestCancelled.
+        """
+        scope = scope or CancelScope()
+        
+        def send(url):
+            with open(video_path, 'rb') as video_file, scope.tracking():
+                # Streams the video from disk; requests would build the whole multipart body in memory
+                video = _CancellableReader(video_file, scope)
+                encoder = MultipartEncoder(fields={**data, 'video': ('video.mp4', video, 'video/mp4')})
+                return self._session.post(url, data=encoder, headers={'Content-Type': encoder.content_type},
+                                          timeout=self.timeout)
+        
+        url = ', '.join(urls)
+        try:
+            response = with_failover(urls, send, current_app.logger)
+            response.raise_for_status()
+            return response_json(response)
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            raise _service_error(url, e, upload=True)
     
-    def _get_job_storage_path(self, job_id):
-        """Get storage path for a job"""
-        return os.path.join(self.upload_folder, f'job_{job_id}')
+    def _get_job_paths(self, job_id):
+        """Get storage paths for a job"""
+        return _JobPaths.for_job(self.upload_folder, job_id)
     
     def _ensure_storage_directory(self, job_id):
-        """Ensure storage directory exists for a job"""
-        storage_path = self._get_job_storage_path(job_id)
-        os.makedirs(storage_path, exist_ok=True)
-        return storage_path
+        """Ensure storage directory exists for a job; returns its paths"""
+        paths = self._get_job_paths(job_id)
+        os.makedirs(paths.storage, exist_ok=True)
+        return paths
+    
+    def _cached_result(self, video_hash, kind, urls):
+        """Result an earlier job got for the same video from the same service, or None"""
+        if not video_hash:
+            return None
+        entry = ArtifactCache.query.filter_by(video_hash=video_hash, kind=kind, source=', '.join(urls))\
+            .order_by(ArtifactCache.id.desc())\
+            .first()
+        if not entry:
+            return None
+        try:
+            return _read_json(entry.path)
+        except (OSError, orjson.JSONDecodeError):
+            # Removed, or that job has not finished writing it yet; run the stage again
+            return None
+    
+    def _remember_result(self, video_hash, kind, urls, path):
+        """Record a stage result of the service at urls for reuse; committed with the stage's status"""
+        if video_hash:
+            db.session.add(ArtifactCache(video_hash=video_hash, kind=kind, source=', '.join(urls), path=path))
     
-    def start_ocr_processing(self, job_id, video_path):
-        """Start OCR processing for a video"""
-        job = Job.query.get(job_id)
+    def start_ocr_processing(self, job_id, paths=None, writes=None):
+        """Start OCR processing for a video and return its result.
+        When a writes list is given, ocr_output.json is written in the background and its future appended.
+        """
+        job = db.session.get(Job, job_id)
         if not job:
             raise ValueError(f"Job {job_id} not found")
         
         try:
-            job.ocr_status = 'running'
-            db.session.commit()
-            
-            storage_path = self._get_job_storage_path(job_id)
-            video_full_path = os.path.join(storage_path, 'video.mp4')
-            
-            data = {'job_id': str(job_id)}
-            ocr_endpoint = f"{self.ocr_url}/process"
-            result = self._post_with_files_retry(ocr_endpoint, data, video_full_path)
+            if job.ocr_status != 'running':
+                # process_job marks both stages running in a single commit
+                job.ocr_status = 'running'
+                db.session.commit()
             
-            ocr_output_path = os.path.join(storage_path, 'ocr_output.json')
-            with open(ocr_output_path, 'w') as f:
-                json.dump(result, f, indent=2)
+            paths = paths or self._get_job_paths(job_id)
+            result = self._cached_result(job.video_hash, 'ocr', self.ocr_urls)
+            if result is None:
+                data = {'job_id': str(job_id)}
+                ocr_endpoints = [f"{url}/process" for url in self.ocr_urls]
+                result = self._post_with_files_retry(ocr_endpoints, data, paths.video,
+                                                     _cancel_scopes.get(job_id))
+                self._remember_result(job.video_hash, 'ocr', self.ocr_urls, paths.ocr_output)
+            _save_result(paths.ocr_output, result, writes)
             
             job.ocr_status = 'done'
             job.status_message = None
             db.session.commit()
             return result
+        except RequestCancelled:
+            # Stopped because the job was cancelled, not a failure. Refreshed first so the
+            # status snapshot written with this update shows the cancellation.
+            db.session.refresh(job)
+            job.ocr_status = 'cancelled'
+            db.session.commit()
+            raise
         except Exception as e:
             job.ocr_status = 'failed'
             job.status_message = f"OCR: {str(e)}"
             db.session.commit()
             raise Exception(f"OCR processing failed: {str(e)}")
     
-    def start_whisper_processing(self, job_id, video_path):
-        """Start Whisper processing for a video"""
-        job = Job.query.get(job_id)
+    def start_whisper_processing(self, job_id, paths=None, writes=None):
+        """Start Whisper processing for a video and return its result.
+        When a writes list is given, transcript.json is written in the background and its future appended.
+        """
+        job = db.session.get(Job, job_id)
         if not job:
             raise ValueError(f"Job {job_id} not found")
         
         try:
-            job.whisper_status = 'running'
-            db.session.commit()
-            
-            storage_path = self._get_job_storage_path(job_id)
-            video_full_path = os.path.join(storage_path, 'video.mp4')
-            
-            data = {'job_id': str(job_id)}
-            whisper_endpoint = f"{self.whisper_url}/transcribe"
-            result = self._post_with_files_retry(whisper_endpoint, data, video_full_path)
+            if job.whisper_status != 'running':
+                # process_job marks both stages running in a single commit
+                job.whisper_status = 'running'
+                db.session.commit()
             
-            transcript_path = os.path.join(storage_path, 'transcript.json')
-            with open(transcript_path, 'w') as f:
-                json.dump(result, f, indent=2)
+            paths = paths or self._get_job_paths(job_id)
+            result = self._cached_result(job.video_hash, 'transcript', self.whisper_urls)
+            if result is None:
+                data = {'job_id': str(job_id)}
+                whisper_endpoints = [f"{url}/transcribe" for url in self.whisper_urls]
+                result = self._post_with_files_retry(whisper_endpoints, data, paths.video,
+                                                     _cancel_scopes.get(job_id))
+                self._remember_result(job.video_hash, 'transcript', self.whisper_urls, paths.transcript)
+            _save_result(paths.transcript, result, writes)
             
             job.whisper_status = 'done'
             job.status_message = None
             db.session.commit()
             return result
+        except RequestCancelled:
+            # Stopped because the job was cancelled, not a failure. Refreshed first so the
+            # status snapshot written with this update shows the cancellation.
+            db.session.refresh(job)
+            job.whisper_status = 'cancelled'
+            db.session.commit()
+            raise
         except Exception as e:
             job.whisper_status = 'failed'
             job.status_message = f"Whisper: {str(e)}"
             db.session.commit()
             raise Exception(f"Whisper processing failed: {str(e)}")
     
-    def start_llm_processing(self, job_id):
-        """Start LLM processing after OCR and Whisper complete"""
-        job = Job.query.get(job_id)
+    def start_combined_processing(self, job_id, paths=None, writes=None):
+        """Upload the video once to the combined service, which runs OCR and Whisper on it.
+        Returns (ocr_result, transcript_result), stored the same way as the separate stages.
+        """
+        job = db.session.get(Job, job_id)
+        if not job:
+            raise ValueError(f"Job {job_id} not found")
+        
+        try:
+            if job.ocr_status != 'running' or job.whisper_status != 'running':
+                job.ocr_status = 'running'
+                job.whisper_status = 'running'
+                db.session.commit()
+            
+            paths = paths or self._get_job_paths(job_id)
+            ocr_result = self._cached_result(job.video_hash, 'ocr', self.combined_urls)
+            transcript_result = self._cached_result(job.video_hash, 'transcript', self.combined_urls)
+            if ocr_result is None or transcript_result is None:
+                data = {'job_id': str(job_id)}
+                combined_endpoints = [f"{url}/process" for url in self.combined_urls]
+                result = self._post_with_files_retry(combined_endpoints, data, paths.video,
+                                                     _cancel_scopes.get(job_id))
+                
+                ocr_result = result.get('ocr')
+                transcript_result = result.get('transcript')
+                if ocr_result is None or transcript_result is None:
+                    raise ValueError("Response must contain both 'ocr' and 'transcript'")
+                self._remember_result(job.video_hash, 'ocr', self.combined_urls, paths.ocr_output)
+                self._remember_result(job.video_hash, 'transcript', self.combined_urls, paths.transcript)
+            
+            _save_result(paths.ocr_output, ocr_result, writes)
+            _save_result(paths.transcript, transcript_result, writes)
+            
+            job.ocr_status = 'done'
+            job.whisper_status = 'done'
+            job.status_message = None
+            db.session.commit()
+            return ocr_result, transcript_result
+        except RequestCancelled:
+            # Stopped because the job was cancelled, not a failure. Refreshed first so the
+            # status snapshot written with this update shows the cancellation.
+            db.session.refresh(job)
+            job.ocr_status = 'cancelled'
+            job.whisper_status = 'cancelled'
+            db.session.commit()
+            raise
+        except Exception as e:
+            job.ocr_status = 'failed'
+            job.whisper_status = 'failed'
+            job.status_message = f"OCR/Whisper: {str(e)}"
+            db.session.commit()
+            raise Exception(f"OCR/Whisper processing failed: {str(e)}")
+    
+    def _run_in_app_context(self, app, stage, *args):
+        with app.app_context():
+            return stage(*args)
+    
+    def _watch_for_cancel(self, app, job_id, scope, finished):
+        """Until finished is set, poll the job's status; on cancellation, abort the requests in
+        flight and ask the services to drop the job so they stop using the GPU on it.
+        """
+        while True:
+            # Wakes at once when signal_cancel() is called in this process
+            cancelled = scope.event.wait(_CANCEL_POLL_SECONDS)
+            if finished.is_set() and not cancelled:
+                return
+            if not cancelled:
+                with app.app_context():
+                    final_status = db.session.execute(
+                        db.select(Job.final_status).where(Job.id == job_id)).scalar()
+                if final_status != 'cancelled':
+                    continue
+                scope.cancel()
+            
+            urls = self.combined_urls or self.ocr_urls + self.whisper_urls
+            for url in urls:
+                try:
+                    self._session.delete(f"{url}/job/{job_id}", timeout=5)
+                except requests.exceptions.RequestException as e:
+                    app.logger.warning(f"Could not cancel job {job_id} at {url}: {e}")
+            return
+    
+    def _run_separate_stages(self, job_id, paths, app, writes):
+        """Run OCR and Whisper in parallel on the stage pool and return (ocr_result, transcript_result).
+        Each stage gets its own app context (and so its own DB session).
+        """
+        ocr_future = self._stage_pool.submit(
+            self._run_in_app_context, app, self.start_ocr_processing, job_id, paths, writes)
+        whisper_future = self._stage_pool.submit(
+            self._run_in_app_context, app, self.start_whisper_processing, job_id, paths, writes)
+        wait([ocr_future, whisper_future])
+        
+        # result() re-raises a stage's error; OCR's is reported first when both fail
+        return ocr_future.result(), whisper_future.result()
+    
+    def start_llm_processing(self, job_id, ocr_data=None, transcript_data=None, writes=(), paths=None):
+        """Start LLM processing after OCR and Whisper complete.
+        ocr_data/transcript_data skip reading the stage results back from disk; the job is only
+        marked done once the pending writes have finished.
+        """
+        job = db.session.get(Job, job_id)
         if not job:
             raise ValueError(f"Job {job_id} not found")
         
@@ -179,14 +446,11 @@ class OrchestratorService:
             job.llm_status = 'running'
             db.session.commit()
             
-            storage_path = self._get_job_storage_path(job_id)
-            ocr_path = os.path.join(storage_path, 'ocr_output.json')
-            transcript_path = os.path.join(storage_path, 'transcript.json')
-            
-            with open(ocr_path, 'r') as f:
-                ocr_data = json.load(f)
-            with open(transcript_path, 'r') as f:
-                transcript_data = json.load(f)
+            paths = paths or self._get_job_paths(job_id)
+            if ocr_data is None:
+                ocr_data = _read_json(paths.ocr_output)
+            if transcript_data is None:
+                transcript_data = _read_json(paths.transcript)
             
             llm_payload = {
                 'job_id': str(job_id),
@@ -194,12 +458,13 @@ class OrchestratorService:
                 'transcript': transcript_data
             }
             
-            llm_endpoint = f"{self.llm_url}/process"
-            result = self._make_request(llm_endpoint, method='POST', data=llm_payload)
+            llm_endpoints = [f"{url}/process" for url in self.llm_urls]
+            result = self._make_request(llm_endpoints, method='POST', data=llm_payload)
             
-            final_notes_path = os.path.join(storage_path, 'final_notes.json')
-            with open(final_notes_path, 'w') as f:
-                json.dump(result, f, indent=2)
+            _write_json(paths.final_notes, result, current_app.debug)
+            # The lecture page and chat read these files, so they must exist before the job is done
+            for write in writes:
+                write.result()
             
             lecture = Lecture.query.filter_by(job_id=job_id).first()
             if not lecture:
@@ -207,8 +472,8 @@ class OrchestratorService:
                 db.session.add(lecture)
             
             lecture.summary = result.get('summary', '')
-            lecture.notes_path = final_notes_path
-            lecture.transcript_path = transcript_path
+            lecture.notes_path = paths.final_notes
+            lecture.transcript_path = paths.transcript
             
             job.llm_status = 'done'
             job.final_status = 'done'
@@ -227,89 +492,66 @@ class OrchestratorService:
         """Main orchestration method: process a job through all stages.
         flask_app: pass the Flask app instance so worker threads can use app.app_context().
         """
-        job = Job.query.get(job_id)
+        job = db.session.get(Job, job_id)
         if not job:
             raise ValueError(f"Job {job_id} not found")
         if job.final_status == 'cancelled':
             return False
         
-        storage_path = self._ensure_storage_directory(job_id)
-        video_path = os.path.join(storage_path, 'video.mp4')
+        paths = self._ensure_storage_directory(job_id)
         
         app = flask_app or current_app._get_current_object()
         
         try:
-            # Step 1: Start OCR and Whisper in parallel (each thread needs its own app context)
-            import threading
-            
-            ocr_error = None
-            whisper_error = None
-            
-            def run_ocr():
-                nonlocal ocr_error
-                with app.app_context():
-                    try:
-                        self.start_ocr_processing(job_id, video_path)
-                    except Exception as e:
-                        ocr_error = e
-            
-            def run_whisper():
-                nonlocal whisper_error
-                with app.app_context():
-                    try:
-                        self.start_whisper_processing(job_id, video_path)
-                    except Exception as e:
-                        whisper_error = e
-            
-            ocr_thread = threading.Thread(target=run_ocr)
-            whisper_thread = threading.Thread(target=run_whisper)
-            
-            ocr_thread.start()
-            whisper_thread.start()
-            
-            ocr_thread.join()
-            whisper_thread.join()
-            
-            if ocr_error:
-                raise ocr_error
-            if whisper_error:
-                raise whisper_error
-            
-            # Step 2: Wait for both to complete, then trigger LLM
-            attempts = 0
-            while attempts < self.max_poll_attempts:
-                job = Job.query.get(job_id)
-                if job.final_status == 'cancelled':
-                    return False
-                if job.ocr_status == 'done' and job.whisper_status == 'done':
-                    break
-                if job.ocr_status == 'failed' or job.whisper_status == 'failed':
-                    raise Exception("OCR or Whisper processing failed")
-                time.sleep(self.poll_interval)
-                attempts += 1
+            # Step 1: OCR and Whisper, either as one upload to the combined service or as two
+            # parallel ones. Results are handed to the LLM stage in memory while the JSON files
+            # are written.
+            writes = []
+            job.ocr_status = 'running'
+            job.whisper_status = 'running'
+            db.session.commit()
             
-            if attempts >= self.max_poll_attempts:
-                raise Exception("Timeout waiting for OCR/Whisper to complete")
+            scope = CancelScope()
+            finished = threading.Event()
+            with _cancel_scopes_lock:
+                _cancel_scopes[job_id] = scope
+            threading.Thread(target=self._watch_for_cancel, args=(app, job_id, scope, finished),
+                             name=f'cancel-watch-{job_id}', daemon=True).start()
+            try:
+                if self.combined_urls:
+                    ocr_data, transcript_data = self.start_combined_processing(job_id, paths, writes)
+                else:
+                    ocr_data, transcript_data = self._run_separate_stages(job_id, paths, app, writes)
+            finally:
+                finished.set()
+                with _cancel_scopes_lock:
+                    _cancel_scopes.pop(job_id, None)
             
-            job = Job.query.get(job_id)
+            # Step 2: Both stages are final once they return, so there is nothing to poll for.
+            # One refresh of the status columns picks up the stage threads' commits and any cancellation.
+            db.session.refresh(job, ['ocr_status', 'whisper_status', 'final_status'])
             if job.final_status == 'cancelled':
                 return False
             
             # Step 3: Trigger LLM processing
-            self.start_llm_processing(job_id)
+            self.start_llm_processing(job_id, ocr_data, transcript_data, writes, paths)
             
             return True
         except Exception as e:
-            job = Job.query.get(job_id)
-            if job.final_status != 'cancelled':
-                job.final_status = 'failed'
-                if not job.status_message:
-                    job.status_message = str(e)
-                if job.ocr_status in ('pending', 'running'):
-                    job.ocr_status = 'failed'
-                if job.whisper_status in ('pending', 'running'):
-                    job.whisper_status = 'failed'
-                if job.llm_status in ('pending', 'running'):
-                    job.llm_status = 'failed'
-                db.session.commit()
+            # Clears a failed flush and expires the job, so the checks below see current statuses
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            if job.final_status == 'cancelled':
+                # A stage was stopped by the cancellation
+                return False
+            job.final_status = 'failed'
+            if not job.status_message:
+                job.status_message = str(e)
+            if job.ocr_status in ('pending', 'running'):
+                job.ocr_status = 'failed'
+            if job.whisper_status in ('pending', 'running'):
+                job.whisper_status = 'failed'
+            if job.llm_status in ('pending', 'running'):
+                job.llm_status = 'failed'
+            db.session.commit()
             raise Exception(f"Job processing failed: {str(e)}")
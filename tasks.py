@@ -0,0 +1,21 @@
+from celery import Celery
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import Config
+
+celery_app = Celery('lecture', broker=Config.CELERY_BROKER_URL)
+celery_app.conf.task_default_queue = Config.CELERY_QUEUE
+# Jobs run for minutes; don't let one worker reserve a backlog of them
+celery_app.conf.worker_prefetch_multiplier = 1
+
+@celery_app.task(acks_late=True)
+def process_job(job_id):
+    """Run a job through OCR, Whisper and LLM on a worker process.
+    Not retried on failure: the orchestrator marks the job failed, and a retry
+    would upload the video to OCR/Whisper a second time.
+    """
+    from app import app, get_orchestrator
+    with app.app_context():
+        return get_orchestrator().process_job(job_id, flask_app=app)
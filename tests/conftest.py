@@ -0,0 +1,175 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass, field
+
+import orjson
+import pytest
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+# Config is read when app is imported, so point it at throwaway storage first
+_tmp = tempfile.mkdtemp(prefix='lecture-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ['UPLOAD_FOLDER'] = os.path.join(_tmp, 'storage')
+for name in ('CELERY_BROKER_URL', 'REDIS_URL', 'COMBINED_SERVICE_URL', 'NGINX_UPLOAD_DIR'):
+    os.environ.pop(name, None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app, init_db, hash_file  # noqa: E402
+from models import db, Job, Lecture, User  # noqa: E402
+from services.orchestrator import OrchestratorService  # noqa: E402
+
+@pytest.fixture
+def app():
+    init_db()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+    shutil.rmtree(flask_app.config['UPLOAD_FOLDER'], ignore_errors=True)
+
+@pytest.fixture
+def client(app):
+    """Test client logged in as the default user created by init_db"""
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    # Shows the login flash message, which would otherwise keep the next page from being cached
+    client.get('/')
+    return client
+
+@pytest.fixture
+def serve():
+    """Start a Flask app standing in for an external service; returns its base URL"""
+    servers = []
+    
+    def start(service_app):
+        server = make_server('127.0.0.1', 0, service_app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_port}'
+    
+    yield start
+    for server in servers:
+        server.shutdown()
+
+@dataclass
+class FakeService:
+    """A started stand-in service: its base URL and the calls it received, in order"""
+    url: str
+    calls: list = field(default_factory=list)
+
+@pytest.fixture
+def media_service(serve):
+    """Start an OCR + Whisper stand-in. Its calls are ('ocr' or 'whisper', job_id, video bytes);
+    OCR answers {'text': video} and Whisper {'segments': [video]}.
+    """
+    def start():
+        app = Flask('media')
+        fake = FakeService(serve(app))
+        
+        @app.route('/process', methods=['POST'])
+        def ocr():
+            video = request.files['video'].read()
+            fake.calls.append(('ocr', request.form['job_id'], video))
+            return jsonify({'text': video.decode()})
+        
+        @app.route('/transcribe', methods=['POST'])
+        def whisper():
+            video = request.files['video'].read()
+            fake.calls.append(('whisper', request.form['job_id'], video))
+            return jsonify({'segments': [video.decode()]})
+        
+        return fake
+    
+    return start
+
+@pytest.fixture
+def llm_service(serve):
+    """Start an LLM stand-in. Its calls are (path, JSON body). /process answers with a summary;
+    /chat answers with `answer`, or streams `tokens` as Server-Sent Events when asked to.
+    """
+    def start(answer='answer', tokens=()):
+        app = Flask('llm')
+        fake = FakeService(serve(app))
+        
+        @app.route('/process', methods=['POST'])
+        def process():
+            fake.calls.append(('/process', request.get_json()))
+            return jsonify({'summary': 'summary', 'notes': ['a point']})
+        
+        @app.route('/chat', methods=['POST'])
+        def chat():
+            fake.calls.append(('/chat', request.get_json()))
+            if not tokens or 'text/event-stream' not in request.headers.get('Accept', ''):
+                return jsonify({'answer': answer})
+            
+            def events():
+                for token in tokens:
+                    yield f'data: {orjson.dumps({"token": token}).decode()}\n\n'.encode()
+                yield b'data: [DONE]\n\n'
+            
+            # No charset, as many SSE servers send it; the spec makes the stream UTF-8
+            return Response(events(), content_type='text/event-stream')
+        
+        return fake
+    
+    return start
+
+@pytest.fixture
+def orchestrator(app):
+    """Build an OrchestratorService for the service URLs given as config overrides"""
+    def build(**config):
+        app.config.update(config)
+        return OrchestratorService(app)
+    
+    saved = dict(app.config)
+    yield build
+    app.config.clear()
+    app.config.update(saved)
+
+@pytest.fixture
+def make_job(app):
+    """Create a job with the given video bytes saved where the orchestrator expects them"""
+    def make(video=b'video'):
+        with app.app_context():
+            user = User.query.first()
+            job = Job(user_id=user.id, video_path='')
+            db.session.add(job)
+            db.session.commit()
+            
+            storage = os.path.join(app.config['UPLOAD_FOLDER'], f'job_{job.id}')
+            os.makedirs(storage, exist_ok=True)
+            job.video_path = os.path.join(storage, 'video.mp4')
+            with open(job.video_path, 'wb') as f:
+                f.write(video)
+            job.video_hash = hash_file(job.video_path)
+            db.session.commit()
+            return job.id
+    
+    return make
+
+@pytest.fixture
+def make_lecture(app, make_job):
+    """Create a finished job and its lecture, with notes and transcript on disk"""
+    def make():
+        job_id = make_job()
+        with app.app_context():
+            job = db.session.get(Job, job_id)
+            job.ocr_status = job.whisper_status = job.llm_status = job.final_status = 'done'
+            storage = os.path.dirname(job.video_path)
+            notes_path = os.path.join(storage, 'final_notes.json')
+            transcript_path = os.path.join(storage, 'transcript.json')
+            with open(notes_path, 'wb') as f:
+                f.write(orjson.dumps({'summary': 'summary', 'notes': ['a point']}))
+            with open(transcript_path, 'wb') as f:
+                f.write(orjson.dumps({'segments': []}))
+            lecture = Lecture(job_id=job_id, summary='summary', notes_path=notes_path, transcript_path=transcript_path)
+            db.session.add(lecture)
+            db.session.commit()
+            return lecture.id
+    
+    return make
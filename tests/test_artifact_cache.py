@@ -0,0 +1,71 @@
+import io
+import hashlib
+import tempfile
+
+import orjson
+
+from app import save_upload
+from models import db, Job, ArtifactCache
+
+def run_job(app, orchestrator, job_id):
+    with app.app_context():
+        orchestrator.process_job(job_id, flask_app=app)
+        return db.session.get(Job, job_id).final_status
+
+def stages(*services):
+    return sorted(call[0] for service in services for call in service.calls)
+
+def test_same_video_reuses_results(app, orchestrator, make_job, media_service, llm_service):
+    media = media_service()
+    service = orchestrator(OCR_SERVICE_URL=media.url, WHISPER_SERVICE_URL=media.url,
+                           LLM_SERVICE_URL=llm_service().url)
+    
+    assert run_job(app, service, make_job(b'lecture')) == 'done'
+    assert run_job(app, service, make_job(b'lecture')) == 'done'
+    assert stages(media) == ['ocr', 'whisper']
+    
+    assert run_job(app, service, make_job(b'another lecture')) == 'done'
+    assert stages(media) == ['ocr', 'ocr', 'whisper', 'whisper']
+
+def test_changed_service_url_skips_old_results(app, orchestrator, make_job, media_service, llm_service):
+    first, second = media_service(), media_service()
+    llm_url = llm_service().url
+    
+    service = orchestrator(OCR_SERVICE_URL=first.url, WHISPER_SERVICE_URL=first.url, LLM_SERVICE_URL=llm_url)
+    assert run_job(app, service, make_job(b'lecture')) == 'done'
+    
+    service = orchestrator(OCR_SERVICE_URL=second.url, WHISPER_SERVICE_URL=first.url, LLM_SERVICE_URL=llm_url)
+    assert run_job(app, service, make_job(b'lecture')) == 'done'
+    assert stages(first, second) == ['ocr', 'ocr', 'whisper']
+
+def test_cached_result_lookup(app, orchestrator, tmp_path):
+    result_path = tmp_path / 'ocr_output.json'
+    result_path.write_bytes(orjson.dumps({'text': 'board'}))
+    service = orchestrator()
+    
+    with app.app_context():
+        db.session.add(ArtifactCache(video_hash='abc', kind='ocr', source='http://ocr', path=str(result_path)))
+        db.session.add(ArtifactCache(video_hash='abc', kind='transcript', source='http://ocr',
+                                     path=str(tmp_path / 'missing.json')))
+        db.session.commit()
+        
+        assert service._cached_result('abc', 'ocr', ['http://ocr']) == {'text': 'board'}
+        assert service._cached_result('abc', 'ocr', ['http://other']) is None
+        assert service._cached_result('def', 'ocr', ['http://ocr']) is None
+        assert service._cached_result(None, 'ocr', ['http://ocr']) is None
+        # The file is gone, so the stage has to run again
+        assert service._cached_result('abc', 'transcript', ['http://ocr']) is None
+
+def test_save_upload_returns_content_hash(app, tmp_path):
+    data = b'frame' * 300000
+    expected = hashlib.blake2b(data).hexdigest()
+    
+    assert save_upload(io.BytesIO(data), tmp_path / 'streamed.mp4') == expected
+    assert (tmp_path / 'streamed.mp4').read_bytes() == data
+    
+    # Uploads werkzeug spooled to disk go through the same single read-hash-write pass
+    with tempfile.TemporaryFile() as spooled:
+        spooled.write(data)
+        spooled.seek(0)
+        assert save_upload(spooled, tmp_path / 'spooled.mp4') == expected
+    assert (tmp_path / 'spooled.mp4').read_bytes() == data
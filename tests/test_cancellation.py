@@ -0,0 +1,106 @@
+import threading
+import time
+
+import orjson
+import pytest
+from flask import Flask, jsonify, request
+
+from services.http import CancelScope, RequestCancelled, build_session
+from services.orchestrator import signal_cancel
+from models import db, Job
+
+SERVICE_DELAY = 10
+
+def stalled_service(deletes, release):
+    """Reads the video, then only answers after SERVICE_DELAY seconds; DELETE is recorded but ignored"""
+    service = Flask('stalled')
+    
+    @service.route('/process', methods=['POST'])
+    @service.route('/transcribe', methods=['POST'])
+    def process():
+        request.files['video'].read()
+        release.wait(SERVICE_DELAY)
+        return jsonify({})
+    
+    @service.route('/job/<job_id>', methods=['DELETE'])
+    def cancel(job_id):
+        deletes.append(job_id)
+        return '', 204
+    
+    return service
+
+@pytest.fixture
+def stalled(serve):
+    deletes, release = [], threading.Event()
+    yield serve(stalled_service(deletes, release)), deletes
+    release.set()
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+def cancel_later(app, job_id, signal, delay=0.5):
+    def cancel():
+        time.sleep(delay)
+        with app.app_context():
+            job = db.session.get(Job, job_id)
+            job.final_status = 'cancelled'
+            job.status_message = 'Cancelled by user'
+            db.session.commit()
+        if signal:
+            signal_cancel(job_id)
+    
+    threading.Thread(target=cancel, daemon=True).start()
+
+@pytest.mark.parametrize('signal', [True, False], ids=['signal_cancel', 'database_only'])
+def test_cancel_aborts_stages_waiting_for_a_reply(app, orchestrator, make_job, stalled, signal):
+    url, deletes = stalled
+    service = orchestrator(OCR_SERVICE_URL=url, WHISPER_SERVICE_URL=url)
+    job_id = make_job()
+    
+    cancel_later(app, job_id, signal)
+    started = time.monotonic()
+    with app.app_context():
+        assert service.process_job(job_id, flask_app=app) is False
+    assert time.monotonic() - started < 3
+    
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        assert (job.ocr_status, job.whisper_status, job.final_status) == ('cancelled', 'cancelled', 'cancelled')
+        assert job.status_message == 'Cancelled by user'
+        assert orjson.loads(job.status_snapshot)['final_status'] == 'cancelled'
+    # Sent by the watchdog once it has aborted the requests
+    assert wait_for(lambda: deletes == [str(job_id), str(job_id)])
+
+def test_cancel_aborts_combined_upload(app, orchestrator, make_job, stalled):
+    url, deletes = stalled
+    service = orchestrator(COMBINED_SERVICE_URL=url)
+    job_id = make_job()
+    
+    cancel_later(app, job_id, signal=True)
+    started = time.monotonic()
+    with app.app_context():
+        assert service.process_job(job_id, flask_app=app) is False
+    assert time.monotonic() - started < 3
+    
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        assert (job.ocr_status, job.whisper_status) == ('cancelled', 'cancelled')
+    assert wait_for(lambda: deletes == [str(job_id)])
+
+def test_cancel_scope_aborts_blocked_request(stalled):
+    url, deletes = stalled
+    session = build_session(max_retries=0, cancellable=True)
+    scope = CancelScope()
+    threading.Timer(0.3, scope.cancel).start()
+    
+    started = time.monotonic()
+    with pytest.raises(RequestCancelled), scope.tracking():
+        session.post(f'{url}/process', files={'video': b'frames'}, timeout=SERVICE_DELAY * 2)
+    assert time.monotonic() - started < 2
+    
+    # Cancelled scopes refuse new requests before anything is sent
+    with pytest.raises(RequestCancelled), scope.tracking():
+        session.post(f'{url}/process', files={'video': b'frames'}, timeout=SERVICE_DELAY * 2)
@@ -0,0 +1,24 @@
+import orjson
+
+from models import db, Chat
+from services.chat_service import ChatService
+
+def test_streamed_answer_is_decoded_as_utf8(app, client, make_lecture, llm_service, monkeypatch):
+    llm = llm_service(tokens=['café ', 'ü'])
+    monkeypatch.setitem(app.config, 'LLM_SERVICE_URL', llm.url)
+    monkeypatch.setitem(app.extensions, 'chat_service', ChatService(app))
+    lecture_id = make_lecture()
+    
+    response = client.post(f'/api/lectures/{lecture_id}/chat', json={'question': 'Was ist das?'},
+                           headers={'Accept': 'text/event-stream'})
+    assert response.mimetype == 'text/event-stream'
+    tokens = [orjson.loads(line[5:])['token'] for line in response.get_data(as_text=True).splitlines()
+              if line.startswith('data:') and '"token"' in line]
+    assert ''.join(tokens) == 'café ü'
+    
+    [(path, payload)] = llm.calls
+    assert path == '/chat'
+    assert payload['question'] == 'Was ist das?'
+    with app.app_context():
+        chat = db.session.query(Chat).filter_by(lecture_id=lecture_id).one()
+        assert chat.answer == 'café ü'
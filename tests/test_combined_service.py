@@ -0,0 +1,53 @@
+import os
+
+import orjson
+import pytest
+from flask import Flask, jsonify, request
+
+from models import db, Job, Lecture
+
+def combined_service(calls, reply):
+    service = Flask('combined')
+    
+    @service.route('/process', methods=['POST'])
+    def process():
+        calls.append((request.form['job_id'], request.files['video'].read()))
+        return jsonify(reply)
+    
+    return service
+
+def test_video_is_uploaded_once(app, serve, orchestrator, make_job, llm_service):
+    calls = []
+    reply = {'ocr': {'text': 'board'}, 'transcript': {'segments': ['hello']}}
+    llm = llm_service()
+    service = orchestrator(COMBINED_SERVICE_URL=serve(combined_service(calls, reply)),
+                           OCR_SERVICE_URL='http://127.0.0.1:1', WHISPER_SERVICE_URL='http://127.0.0.1:1',
+                           LLM_SERVICE_URL=llm.url)
+    job_id = make_job(b'lecture')
+    
+    with app.app_context():
+        assert service.process_job(job_id, flask_app=app) is True
+        job = db.session.get(Job, job_id)
+        assert (job.ocr_status, job.whisper_status, job.final_status) == ('done', 'done', 'done')
+        lecture = Lecture.query.filter_by(job_id=job_id).one()
+        with open(lecture.transcript_path, 'rb') as f:
+            assert orjson.loads(f.read()) == reply['transcript']
+        with open(os.path.join(os.path.dirname(lecture.transcript_path), 'ocr_output.json'), 'rb') as f:
+            assert orjson.loads(f.read()) == reply['ocr']
+    
+    assert calls == [(str(job_id), b'lecture')]
+    [(path, payload)] = llm.calls
+    assert path == '/process'
+    assert payload['ocr_output'] == reply['ocr']
+    assert payload['transcript'] == reply['transcript']
+
+def test_reply_without_both_results_fails_both_stages(app, serve, orchestrator, make_job):
+    service = orchestrator(COMBINED_SERVICE_URL=serve(combined_service([], {'ocr': {'text': 'board'}})))
+    job_id = make_job()
+    
+    with app.app_context():
+        with pytest.raises(Exception, match="'ocr' and 'transcript'"):
+            service.process_job(job_id, flask_app=app)
+        job = db.session.get(Job, job_id)
+        assert (job.ocr_status, job.whisper_status, job.final_status) == ('failed', 'failed', 'failed')
+        assert job.status_message.startswith('OCR/Whisper:')
@@ -0,0 +1,34 @@
+import time
+
+from flask import Flask
+
+from services import health_check
+
+def service(delay):
+    app = Flask('service')
+    
+    @app.route('/')
+    def root():
+        time.sleep(delay)
+        return 'ok'
+    
+    return app
+
+def test_failover_urls_are_pinged_in_parallel(serve):
+    slow_url, fast_url = serve(service(2)), serve(service(0))
+    
+    started = time.monotonic()
+    assert health_check.check_service('OCR', f'{slow_url}, {fast_url}') == ('up', 'Running')
+    assert time.monotonic() - started < 1
+
+def test_down_service_costs_one_timeout(serve, monkeypatch):
+    monkeypatch.setattr(health_check, 'HEALTH_CHECK_TIMEOUT', 0.5)
+    urls = ', '.join(serve(service(2)) for _ in range(3))
+    
+    started = time.monotonic()
+    status, message = health_check.check_service('OCR', urls)
+    assert status == 'down'
+    assert time.monotonic() - started < 1.5
+
+def test_no_url_set():
+    assert health_check.check_service('OCR', '') == ('down', 'No URL set')
@@ -0,0 +1,39 @@
+from models import db, User
+
+def test_finished_lecture_is_revalidated_on_every_view(app, client, make_lecture):
+    lecture_id = make_lecture()
+    
+    response = client.get(f'/lectures/{lecture_id}')
+    assert response.status_code == 200
+    assert response.cache_control.private and response.cache_control.no_cache
+    assert response.cache_control.max_age is None
+    etag = response.headers['ETag']
+    
+    response = client.get(f'/lectures/{lecture_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.cache_control.no_cache
+    assert response.headers['ETag'] == etag
+
+def test_revalidation_after_logout_goes_to_login(app, client, make_lecture):
+    lecture_id = make_lecture()
+    etag = client.get(f'/lectures/{lecture_id}').headers['ETag']
+    
+    client.get('/logout')
+    response = client.get(f'/lectures/{lecture_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+def test_other_users_cannot_revalidate(app, client, make_lecture):
+    lecture_id = make_lecture()
+    etag = client.get(f'/lectures/{lecture_id}').headers['ETag']
+    with app.app_context():
+        other = User(name='Other', email='other@example.com')
+        other.set_password('secret')
+        db.session.add(other)
+        db.session.commit()
+    
+    other_client = app.test_client()
+    other_client.post('/login', data={'email': 'other@example.com', 'password': 'secret'})
+    other_client.get('/')
+    response = other_client.get(f'/lectures/{lecture_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 302
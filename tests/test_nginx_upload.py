@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from app import hash_file
+from models import db, Job
+
+@pytest.fixture
+def started(monkeypatch):
+    """Job ids handed to processing; nothing is actually processed"""
+    job_ids = []
+    
+    def start_processing(job, video_path, video_hash):
+        job.video_path = video_path
+        job.video_hash = video_hash
+        db.session.commit()
+        job_ids.append(job.id)
+    
+    monkeypatch.setattr('app.start_processing', start_processing)
+    return job_ids
+
+@pytest.fixture
+def upload_dir(app, tmp_path, monkeypatch):
+    path = tmp_path / 'nginx'
+    path.mkdir()
+    monkeypatch.setitem(app.config, 'NGINX_UPLOAD_DIR', str(path))
+    return path
+
+def saved_video(app, job_id):
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        with open(job.video_path, 'rb') as f:
+            return f.read(), job.video_hash
+
+def test_x_file_is_ignored_without_upload_dir(app, client, started, tmp_path):
+    body_file = tmp_path / 'body'
+    body_file.write_bytes(b'from nginx')
+    
+    response = client.post('/upload?filename=lecture.mp4', data=b'from client',
+                           content_type='application/octet-stream', headers={'X-File': str(body_file)})
+    assert response.status_code == 200
+    [job_id] = started
+    assert saved_video(app, job_id)[0] == b'from client'
+    assert body_file.read_bytes() == b'from nginx'
+
+@pytest.mark.parametrize('escape', ['outside', 'dotdot', 'symlink'])
+def test_x_file_outside_upload_dir_is_rejected(app, client, started, upload_dir, tmp_path, escape):
+    outside = tmp_path / 'outside'
+    outside.write_bytes(b'secret')
+    if escape == 'outside':
+        body_file = str(outside)
+    elif escape == 'dotdot':
+        body_file = os.path.join(str(upload_dir), '..', 'outside')
+    else:
+        os.symlink(outside, upload_dir / 'link')
+        body_file = str(upload_dir / 'link')
+    
+    response = client.post('/upload?filename=lecture.mp4', data=b'',
+                           content_type='application/octet-stream', headers={'X-File': body_file})
+    assert response.status_code == 400
+    assert started == []
+    assert outside.read_bytes() == b'secret'
+    with app.app_context():
+        assert Job.query.count() == 0
+
+def test_raw_body_file_is_moved_into_place(app, client, started, upload_dir):
+    body_file = upload_dir / '0000000001'
+    body_file.write_bytes(b'lecture video')
+    
+    response = client.post('/upload?filename=lecture.mp4', data=b'',
+                           content_type='application/octet-stream', headers={'X-File': str(body_file)})
+    assert response.status_code == 200
+    [job_id] = started
+    video, video_hash = saved_video(app, job_id)
+    assert video == b'lecture video'
+    assert not body_file.exists()
+    with app.app_context():
+        assert video_hash == hash_file(db.session.get(Job, job_id).video_path)
+
+def test_multipart_body_file_is_parsed(app, client, started, upload_dir):
+    boundary = 'lecture-boundary'
+    body_file = upload_dir / '0000000002'
+    body_file.write_bytes(
+        f'--{boundary}\r\n'
+        'Content-Disposition: form-data; name="video"; filename="lecture.mp4"\r\n'
+        'Content-Type: video/mp4\r\n\r\n'
+        'lecture video\r\n'
+        f'--{boundary}--\r\n'.encode())
+    
+    response = client.post('/upload', data=b'', headers={'X-File': str(body_file)},
+                           environ_overrides={'CONTENT_TYPE': f'multipart/form-data; boundary={boundary}'})
+    assert response.status_code == 302
+    [job_id] = started
+    assert saved_video(app, job_id)[0] == b'lecture video'
+    assert response.headers['Location'].endswith(f'/jobs/{job_id}')
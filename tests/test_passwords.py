@@ -0,0 +1,58 @@
+from werkzeug.security import generate_password_hash
+
+from models import db, User
+
+def add_user(app, password_hash):
+    with app.app_context():
+        user = User(name='Legacy', email='legacy@example.com', password_hash=password_hash)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+def stored_hash(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).password_hash
+
+def login(client, password):
+    return client.post('/login', data={'email': 'legacy@example.com', 'password': password})
+
+def test_werkzeug_hash_logs_in_and_is_rewritten_to_argon2(app):
+    legacy_hash = generate_password_hash('secret')
+    user_id = add_user(app, legacy_hash)
+    client = app.test_client()
+    
+    response = login(client, 'secret')
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert session['user_id'] == user_id
+    
+    new_hash = stored_hash(app, user_id)
+    assert new_hash.startswith('$argon2')
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        assert user.check_password('secret')
+        assert not user.password_needs_rehash()
+    
+    # The rewritten hash keeps working on the next login
+    assert login(app.test_client(), 'secret').status_code == 302
+
+def test_wrong_password_keeps_werkzeug_hash(app):
+    legacy_hash = generate_password_hash('secret')
+    user_id = add_user(app, legacy_hash)
+    client = app.test_client()
+    
+    assert login(client, 'wrong').status_code == 200
+    with client.session_transaction() as session:
+        assert 'user_id' not in session
+    assert stored_hash(app, user_id) == legacy_hash
+
+def test_current_argon2_hash_is_not_rewritten(app):
+    with app.app_context():
+        user = User(name='Current', email='legacy@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        user_id, current_hash = user.id, user.password_hash
+    
+    assert login(app.test_client(), 'secret').status_code == 302
+    assert stored_hash(app, user_id) == current_hash
@@ -0,0 +1,104 @@
+import socket
+import threading
+import time
+
+import pytest
+import requests
+from flask import Flask, jsonify
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError, ProtocolError
+
+from models import db, Job
+from services.orchestrator import _service_error
+
+URL = 'http://service/process'
+
+def connect_timeout():
+    return requests.exceptions.ConnectTimeout(MaxRetryError(None, URL, ConnectTimeoutError(None, 'timed out')))
+
+def send_timeout():
+    return requests.exceptions.ConnectionError(ProtocolError('Connection aborted.', socket.timeout('timed out')))
+
+def refused():
+    return requests.exceptions.ConnectionError(
+        MaxRetryError(None, URL, NewConnectionError(None, 'Connection refused')))
+
+@pytest.mark.parametrize('error, upload, message', [
+    (connect_timeout(), False, 'Service timeout (response took too long)'),
+    (send_timeout(), False, 'Service timeout (response took too long)'),
+    (requests.exceptions.ReadTimeout(), False, 'Service timeout (response took too long)'),
+    (connect_timeout(), True, 'Upload timed out while sending video'),
+    (send_timeout(), True, 'Upload timed out while sending video'),
+    (requests.exceptions.ReadTimeout(), True, 'Service timeout (response took too long)'),
+    (refused(), False, 'Connection failed'),
+    (refused(), True, 'Connection failed'),
+    (requests.exceptions.SSLError(), True, 'SSL error'),
+    (requests.exceptions.HTTPError('500 Server Error'), False, 'HTTP error from'),
+    (ValueError('bad reply'), True, 'Error calling'),
+])
+def test_service_error_messages(error, upload, message):
+    assert str(_service_error(URL, error, upload=upload)).startswith(message)
+
+def slow_service():
+    app = Flask('slow')
+    
+    @app.route('/process', methods=['POST'])
+    def process():
+        time.sleep(2)
+        return jsonify({})
+    
+    return app
+
+def test_slow_json_call_reports_service_timeout(app, serve, orchestrator):
+    service = orchestrator(SERVICE_TIMEOUT=0.5)
+    
+    with app.app_context(), pytest.raises(Exception, match=r'^Service timeout'):
+        service._make_request([f'{serve(slow_service())}/process'], method='POST', data={})
+
+def drop_after_body(received):
+    """Start a server that reads each whole request, then closes the connection without replying"""
+    listener = socket.create_server(('127.0.0.1', 0))
+    
+    def accept():
+        while True:
+            conn, _ = listener.accept()
+            with conn:
+                data = b''
+                while b'\r\n\r\n' not in data:
+                    data += conn.recv(65536)
+                head, body = data.split(b'\r\n\r\n', 1)
+                length = next(int(line.split(b':')[1]) for line in head.split(b'\r\n')
+                              if line.lower().startswith(b'content-length:'))
+                while len(body) < length:
+                    body += conn.recv(65536)
+                received.append(body)
+    
+    threading.Thread(target=accept, daemon=True).start()
+    return f'http://127.0.0.1:{listener.getsockname()[1]}'
+
+def test_upload_is_not_repeated_after_connection_drops(app, orchestrator, make_job, media_service):
+    received = []
+    media = media_service()
+    service = orchestrator()
+    job_id = make_job(b'lecture')
+    
+    with app.app_context():
+        video_path = db.session.get(Job, job_id).video_path
+        with pytest.raises(Exception, match=r'^Connection failed'):
+            service._post_with_files_retry([f'{drop_after_body(received)}/process', f'{media.url}/process'],
+                                           {'job_id': str(job_id)}, video_path)
+    
+    assert len(received) == 1 and b'lecture' in received[0]
+    assert media.calls == []
+
+def test_upload_fails_over_when_nothing_was_sent(app, orchestrator, make_job, media_service):
+    media = media_service()
+    service = orchestrator()
+    job_id = make_job(b'lecture')
+    
+    with app.app_context():
+        video_path = db.session.get(Job, job_id).video_path
+        result = service._post_with_files_retry(['http://127.0.0.1:1/process', f'{media.url}/process'],
+                                                {'job_id': str(job_id)}, video_path)
+    
+    assert result == {'text': 'lecture'}
+    assert media.calls == [('ocr', str(job_id), b'lecture')]
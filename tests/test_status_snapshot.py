@@ -0,0 +1,59 @@
+import threading
+
+import orjson
+
+from models import db, Job
+from services import job_events
+
+def finish_stage(app, job_id, column, loaded, commit_order, index):
+    """Load the job, wait until the other stage has loaded it too, then mark this stage done"""
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        loaded.wait()
+        commit_order[index].wait()
+        setattr(job, column, 'done')
+        db.session.commit()
+        if index + 1 < len(commit_order):
+            commit_order[index + 1].set()
+
+def test_concurrent_stage_commits_leave_a_current_snapshot(app, make_job):
+    job_id = make_job()
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        job.ocr_status = job.whisper_status = 'running'
+        db.session.commit()
+        events = job_events.subscribe(job_id)
+    
+    # Both sessions hold the job with both stages running before either commits
+    loaded = threading.Barrier(2)
+    commit_order = [threading.Event(), threading.Event()]
+    commit_order[0].set()
+    threads = [
+        threading.Thread(target=finish_stage, args=(app, job_id, 'ocr_status', loaded, commit_order, 0)),
+        threading.Thread(target=finish_stage, args=(app, job_id, 'whisper_status', loaded, commit_order, 1)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        assert (job.ocr_status, job.whisper_status) == ('done', 'done')
+        snapshot = orjson.loads(job.status_snapshot)
+        assert (snapshot['ocr_status'], snapshot['whisper_status']) == ('done', 'done')
+    
+    published = [events.get(timeout=1), events.get(timeout=1)]
+    events.close()
+    assert (published[-1]['ocr_status'], published[-1]['whisper_status']) == ('done', 'done')
+
+def test_status_api_serves_the_snapshot(app, client, make_job):
+    job_id = make_job()
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        job.ocr_status = 'done'
+        db.session.commit()
+    
+    status = client.get(f'/api/jobs/{job_id}/status').get_json()
+    assert status['ocr_status'] == 'done'
+    assert status['whisper_status'] == 'pending'